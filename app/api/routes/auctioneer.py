@@ -2,14 +2,12 @@ from sanic import Blueprint
 from sanic.views import HTTPMethodView
 from sanic_ext import openapi
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.api.routes.deps import AuthUser
 
 from app.api.schemas.listings import (
-    ListingDataSchema,
-    ListingsResponseSchema,
-    BidDataSchema,
-    BidsResponseDataSchema,
+    PaginatedListingsResponseSchema,
     BidsResponseSchema,
 )
 
@@ -26,6 +24,8 @@ from app.api.schemas.auctioneer import (
 )
 from app.api.utils.responses import ReqBody, ResBody
 from app.common.responses import CustomResponse
+from app.db.loaders import listing_card
+from app.db.readmodels import listing_reader
 from app.db.managers.listings import (
     category_manager,
     listing_manager,
@@ -34,7 +34,8 @@ from app.db.managers.listings import (
 from app.db.managers.accounts import user_manager
 from app.db.managers.base import file_manager
 from app.api.utils.decorators import validate_request
-from app.api.utils.validators import validate_quantity
+from app.api.utils.pagination import get_pagination_params, paginate
+from app.api.utils.serializers import bid_serializer, serialize_listings
 
 auctioneer_router = Blueprint("Auctioneer", url_prefix="/api/v2/auctioneer")
 
@@ -43,19 +44,34 @@ class AuctioneerListingsView(HTTPMethodView):
     @openapi.definition(
         summary="Retrieve all listings by the current user",
         description="This endpoint retrieves all listings by the current user",
-        response=ResBody(ListingsResponseSchema),
-        parameter={"name": "quantity", "location": "query", "schema": str},
+        response=ResBody(PaginatedListingsResponseSchema),
+        parameter=[
+            {
+                "name": "limit",
+                "location": "query",
+                "schema": int,
+                "description": "Page size, 50 by default and at most 100",
+            },
+            {
+                "name": "cursor",
+                "location": "query",
+                "schema": str,
+                "description": "The next_cursor of the previous page",
+            },
+            {"name": "quantity", "location": "query", "schema": int},
+        ],
         secured="token",
     )
     async def get(self, request, db: AsyncSession, user: AuthUser, **kwargs):
-        quantity = validate_quantity(request.args.get("quantity"))
-        listings = await listing_manager.get_by_auctioneer_id(db, user.id)
-
-        if quantity:
-            # Retrieve based on amount
-            listings = listings[:quantity]
-        data = [ListingDataSchema.from_orm(listing).dict() for listing in listings]
-        return CustomResponse.success(message="Auctioneer Listings fetched", data=data)
+        cursor, limit = get_pagination_params(request)
+        listings = await listing_reader.get_by_auctioneer_id(
+            db, user.id, cursor, limit + 1
+        )
+        listings, next_cursor = paginate(listings, limit)
+        data = serialize_listings(listings)
+        return CustomResponse.success(
+            message="Auctioneer Listings fetched", data=data, next_cursor=next_cursor
+        )
 
     @openapi.definition(
         body=ReqBody(CreateListingSchema),
@@ -89,12 +105,16 @@ class AuctioneerListingsView(HTTPMethodView):
         )
         data.pop("category", None)
 
-        # Create file object
-        file = await file_manager.create(db, {"resource_type": data["file_type"]})
+        # Create file object, committed along with the listing
+        file_data = {"resource_type": data["file_type"]}
+        file = await file_manager.create(db, file_data, commit=False)
         data.update({"image_id": file.id})
         data.pop("file_type")
 
-        listing = await listing_manager.create(db, data)
+        listing = await listing_manager.create(db, data, commit=False)
+        # The write returns columns only, attach the relationships already at hand
+        set_committed_value(listing, "auctioneer", user)
+        set_committed_value(listing, "category", category)
         data = CreateListingResponseDataSchema.from_orm(listing).dict()
         return CustomResponse.success(
             message="Listing created successfully", data=data, status_code=201
@@ -115,7 +135,7 @@ class UpdateListingView(HTTPMethodView):
         slug = kwargs.get("slug")
         category = data.get("category")
 
-        listing = await listing_manager.get_by_slug(db, slug)
+        listing = await listing_manager.get_by_slug(db, slug, *listing_card())
         if not listing:
             return CustomResponse.error("Listing does not exist!", status_code=404)
 
@@ -140,16 +160,18 @@ class UpdateListingView(HTTPMethodView):
 
             data.update({"category_id": category.id if category else None})
             data.pop("category", None)
+            set_committed_value(listing, "category", category)
 
         file_type = data.get("file_type")
         if file_type:
-            await file_manager.delete(db, listing.image)
+            await file_manager.delete(db, listing.image, commit=False)
             # Create file object
-            file = await file_manager.create(db, {"resource_type": file_type})
+            file_data = {"resource_type": file_type}
+            file = await file_manager.create(db, file_data, commit=False)
             data.update({"image_id": file.id})
         data.pop("file_type", None)
 
-        listing = await listing_manager.update(db, listing, data)
+        listing = await listing_manager.update(db, listing, data, commit=False)
         data = CreateListingResponseDataSchema.from_orm(listing).dict()
         return CustomResponse.success(message="Listing updated successfully", data=data)
 
@@ -174,10 +196,7 @@ class AuctioneerListingBidsView(HTTPMethodView):
             return CustomResponse.error("This listing doesn't belong to you!")
 
         bids = await bid_manager.get_by_listing_id(db, listing.id)
-        data = BidsResponseDataSchema(
-            listing=listing.name,
-            bids=[BidDataSchema.from_orm(bid) for bid in bids],
-        ).dict()
+        data = {"listing": listing.name, "bids": bid_serializer.many(bids)}
         return CustomResponse.success(message="Listing Bids fetched", data=data)
 
 
@@ -206,11 +225,12 @@ class ProfileView(HTTPMethodView):
         file_type = data.get("file_type")
         if file_type:
             # Create file object
-            file = await file_manager.create(db, {"resource_type": file_type})
+            file_data = {"resource_type": file_type}
+            file = await file_manager.create(db, file_data, commit=False)
             data.update({"avatar_id": file.id})
         data.pop("file_type", None)
 
-        user = await user_manager.update(db, user, data)
+        user = await user_manager.update(db, user, data, commit=False)
         data = UpdateProfileResponseDataSchema.from_orm(user).dict()
         return CustomResponse.success(message="User updated!", data=data)
 
@@ -13,20 +13,23 @@ from app.api.schemas.auth import (
 )
 from app.api.schemas.base import ResponseSchema
 from app.api.utils.responses import ReqBody, ResBody
+from app.common.events import EVENTS_LOST, TOKEN_REVOKED, USER_UPDATED
 from app.common.responses import CustomResponse
 from app.db.managers.accounts import user_manager, otp_manager, jwt_manager
 from app.db.managers.base import guestuser_manager
 from app.db.managers.listings import watchlist_manager
 
 from app.api.utils.emails import send_email
-from app.core.security import verify_password
+from app.core.security import verify_password_async
 from app.api.utils.tokens import (
     create_access_token,
     create_refresh_token,
     verify_refresh_token,
+    invalidate_user_tokens,
+    auth_cache,
 )
 from app.api.utils.decorators import validate_request
-from app.db.models.base import GuestUser
+from uuid import UUID
 
 auth_router = Blueprint("Auth", url_prefix="/api/v2/auth")
 
@@ -53,10 +56,10 @@ class RegisterView(HTTPMethodView):
             )
 
         # Create user
-        user = await user_manager.create(db, data)
+        user = await user_manager.create(db, data, commit=False)
 
         # Send verification email
-        await send_email(request, db, user, "activate")
+        await send_email(request, db, user, "activate", commit=False)
 
         return CustomResponse.success(
             message="Registration successful",
@@ -89,11 +92,13 @@ class VerifyEmailView(HTTPMethodView):
         if otp.check_expiration():
             return CustomResponse.error("Expired Otp")
 
-        user = await user_manager.update(db, user_by_email, {"is_email_verified": True})
-        await otp_manager.delete(db, otp)
+        user = await user_manager.update(
+            db, user_by_email, {"is_email_verified": True}, commit=False
+        )
+        await otp_manager.delete(db, otp, commit=False)
 
         # Send welcome email
-        await send_email(request, db, user, "welcome")
+        await send_email(request, db, user, "welcome", commit=False)
         return CustomResponse.success(message="Account verification successful")
 
 
@@ -166,11 +171,13 @@ class SetNewPasswordView(HTTPMethodView):
         if otp.check_expiration():
             return CustomResponse.error("Expired Otp")
 
-        await user_manager.update(db, user_by_email, {"password": password})
-        await otp_manager.delete(db, otp)
+        await user_manager.update(
+            db, user_by_email, {"password": password}, commit=False
+        )
+        await otp_manager.delete(db, otp, commit=False)
 
         # Send password reset success email
-        await send_email(request, db, user_by_email, "reset-success")
+        await send_email(request, db, user_by_email, "reset-success", commit=False)
 
         return CustomResponse.success(message="Password reset successful")
 
@@ -190,35 +197,38 @@ class LoginView(HTTPMethodView):
         email = data["email"]
         plain_password = data["password"]
         user = await user_manager.get_by_email(db, email)
-        if not user or verify_password(plain_password, user.password) == False:
+        if not user or not await verify_password_async(plain_password, user.password):
             return CustomResponse.error("Invalid credentials", status_code=401)
 
         if not user.is_email_verified:
             return CustomResponse.error("Verify your email first", status_code=401)
 
-        await jwt_manager.delete_by_user_id(db, user.id)
+        # Every write below is committed once, by the close_db_session middleware
+        await jwt_manager.delete_by_user_id(db, user.id, commit=False)
 
         # Create tokens and store in jwt model
         access = create_access_token({"user_id": str(user.id)})
         refresh = create_refresh_token()
         await jwt_manager.create(
-            db, {"user_id": user.id, "access": access, "refresh": refresh}
+            db, {"user_id": user.id, "access": access, "refresh": refresh}, commit=False
         )
 
-        # Move all guest user watchlists to the authenticated user watchlists
-        guest_user_watchlists = await watchlist_manager.get_by_session_key(
-            db, client.id if client else None, user.id
-        )
-        if len(guest_user_watchlists) > 0:
-            data_to_create = [
-                {"user_id": user.id, "listing_id": listing_id}.copy()
-                for listing_id in guest_user_watchlists
-            ]
-            await watchlist_manager.bulk_create(db, data_to_create)
-
-        if isinstance(client, GuestUser):
+        # Only a guest with an id can have watchlists to move
+        if client and not client.is_authenticated and client.id:
+            # Move all guest user watchlists to the authenticated user watchlists
+            guest_user_watchlists = await watchlist_manager.get_by_session_key(
+                db, client.id, user.id
+            )
+            if len(guest_user_watchlists) > 0:
+                data_to_create = [
+                    {"user_id": user.id, "listing_id": listing_id}.copy()
+                    for listing_id in guest_user_watchlists
+                ]
+                await watchlist_manager.bulk_create(db, data_to_create, commit=False)
+
             # Delete client (Almost like clearing sessions)
-            await guestuser_manager.delete(db, client)
+            guestuser = await guestuser_manager.get_by_id(db, client.id)
+            await guestuser_manager.delete(db, guestuser, commit=False)
 
         response = CustomResponse.success(
             message="Login successful",
@@ -274,6 +284,18 @@ class LogoutView(HTTPMethodView):
         return CustomResponse.success(message="Logout successful")
 
 
+@auth_router.signal(TOKEN_REVOKED)
+@auth_router.signal(USER_UPDATED)
+async def drop_cached_user(data, **kwargs):
+    # Runs on every worker, so no worker keeps serving a stale or revoked token
+    invalidate_user_tokens(UUID(data["user_id"]))
+
+
+@auth_router.signal(EVENTS_LOST)
+async def drop_auth_cache(**kwargs):
+    auth_cache.clear()
+
+
 auth_router.add_route(RegisterView.as_view(), "/register")
 auth_router.add_route(VerifyEmailView.as_view(), "/verify-email")
 auth_router.add_route(
@@ -1,11 +1,11 @@
-from typing import Union
+from typing import Optional, Union
+from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sanic import Request, SanicException
 
 from app.api.utils.tokens import decodeJWT
 from app.db.managers.base import guestuser_manager
 from app.db.models.accounts import User
-from app.db.models.base import GuestUser
 
 
 class Client:
@@ -16,7 +16,30 @@ class AuthUser:
     pass
 
 
-async def get_client(request: Request, db: AsyncSession) -> Union[User, GuestUser]:
+class GuestClient:
+    """
+    An anonymous client, known only by the id it sent, if any.
+    The guest user row isn't read until a view needs it, see
+    `guestuser_manager.get_or_create`. It is only marked as seen now and then.
+    """
+
+    is_authenticated = False
+
+    def __init__(self, id: Optional[UUID] = None):
+        self.id = id
+
+
+def parse_guest_id(value: Optional[str]) -> Optional[UUID]:
+    # Malformed ids are treated like missing ones, instead of failing in the database
+    if not value:
+        return None
+    try:
+        return UUID(value)
+    except ValueError:
+        return None
+
+
+async def get_client(request: Request, db: AsyncSession) -> Union[User, GuestClient]:
     token = request.headers.get("Authorization", None)  # can also use request.token
     if token:
         is_authorized = await decodeJWT(db, token[7:])
@@ -25,9 +48,10 @@ async def get_client(request: Request, db: AsyncSession) -> Union[User, GuestUse
                 message="Auth Token is invalid or expired", status_code=401
             )
         return is_authorized
-    guestuser_id = request.headers.get("guestuserid", None)
-    guestuser = await guestuser_manager.get_or_create(db, guestuser_id)
-    return guestuser
+    guest_id = parse_guest_id(request.headers.get("guestuserid"))
+    if guest_id:
+        await guestuser_manager.mark_seen(db, guest_id)
+    return GuestClient(guest_id)
 
 
 async def get_user(request: Request, db: AsyncSession) -> User:
@@ -10,6 +10,15 @@ from app.api.schemas.general import (
     ReviewsResponseSchema,
 )
 from app.api.utils.responses import ReqBody, ResBody
+from app.api.utils.response_cache import (
+    ALL_TAGS,
+    CATEGORIES,
+    LISTINGS,
+    REVIEWS,
+    SITEDETAILS,
+    response_cache,
+)
+from app.common.events import CONTENT_CHANGED, EVENTS_LOST, USER_UPDATED
 from app.common.responses import CustomResponse
 from app.db.managers.general import (
     sitedetail_manager,
@@ -29,6 +38,7 @@ class SiteDetailView(HTTPMethodView):
         description="This endpoint retrieves few details of the site/application",
         response=ResBody(SiteDetailResponseSchema),
     )
+    @response_cache.cached(SITEDETAILS)
     async def get(self, request, db: AsyncSession, **kwargs):
         sitedetail = await sitedetail_manager.get(db)
         data = SiteDetailDataSchema.from_orm(sitedetail).dict()
@@ -61,12 +71,33 @@ class ReviewsView(HTTPMethodView):
         description="This endpoint retrieves a few reviews of the application",
         response=ResBody(ReviewsResponseSchema),
     )
+    @response_cache.cached(REVIEWS)
     async def get(self, request, db: AsyncSession, **kwargs):
         reviews = await review_manager.get_active(db)
         data = [ReviewsDataSchema.from_orm(review).dict() for review in reviews]
         return CustomResponse.success(message="Reviews fetched", data=data)
 
 
+@general_router.signal(CONTENT_CHANGED)
+async def drop_cached_content(data, **kwargs):
+    # Tags are named after the table that changed
+    tags = [data["table"]]
+    if data["table"] == CATEGORIES:
+        tags.append(LISTINGS)  # Listings show their category's name
+    await response_cache.invalidate(*tags)
+
+
+@general_router.signal(USER_UPDATED)
+async def drop_cached_reviews(**kwargs):
+    # Reviews show their reviewer's name and avatar
+    await response_cache.invalidate(REVIEWS)
+
+
+@general_router.signal(EVENTS_LOST)
+async def drop_response_cache(**kwargs):
+    await response_cache.invalidate(*ALL_TAGS)
+
+
 general_router.add_route(SiteDetailView.as_view(), "/site-detail")
 general_router.add_route(SubscriberCreateView.as_view(), "/subscribe")
 general_router.add_route(ReviewsView.as_view(), "/reviews")
@@ -6,61 +6,137 @@ from app.api.routes.deps import AuthUser, Client
 
 from app.api.schemas.listings import (
     AddOrRemoveWatchlistSchema,
-    ListingDataSchema,
     ListingsResponseSchema,
-    ListingDetailDataSchema,
+    PaginatedListingsResponseSchema,
+    WatchlistIdsResponseSchema,
     ListingResponseSchema,
     CategoryDataSchema,
     CategoriesResponseSchema,
     CreateBidSchema,
-    BidDataSchema,
-    BidsResponseDataSchema,
     BidsResponseSchema,
     BidResponseSchema,
     ResponseSchema,
 )
 from app.api.utils.responses import ReqBody, ResBody
+from app.api.utils.auctions import auction_scheduler
+from app.api.utils.response_cache import CATEGORIES, LISTINGS, response_cache
+from app.common.events import (
+    BID_PLACED,
+    EVENTS_LOST,
+    LISTING_CLOSED,
+    LISTING_UPDATED,
+    USER_UPDATED,
+)
+from app.common.pubsub import bid_hub
 from app.common.responses import CustomResponse
+from app.db.loaders import bid_card
+from app.db.readmodels import listing_reader
+from app.db.managers.base import guestuser_manager
 from app.db.managers.listings import (
     listing_manager,
     bid_manager,
     watchlist_manager,
     category_manager,
+    BidOutcome,
+)
+from app.api.utils.decorators import cache_control, validate_request
+from app.api.utils.pagination import get_pagination_params, paginate
+from app.api.utils.serializers import (
+    bid_serializer,
+    listing_serializer,
+    serialize_listings,
 )
-from app.api.utils.decorators import validate_request
-from app.api.utils.validators import validate_quantity
+from websockets.exceptions import ConnectionClosed
+from datetime import datetime
+from uuid import UUID
+import asyncio, ujson
 
 listings_router = Blueprint("Listings", url_prefix="/api/v2/listings")
 
+BID_ERRORS = {
+    BidOutcome.NOT_FOUND: ("Listing does not exist!", 404),
+    BidOutcome.OWN_LISTING: ("You cannot bid your own product!", 403),
+    BidOutcome.CLOSED: ("This auction is closed!", 410),
+    BidOutcome.EXPIRED: ("This auction is expired and closed!", 410),
+    BidOutcome.BELOW_PRICE: ("Bid amount cannot be less than the bidding price!", 400),
+    BidOutcome.TOO_LOW: ("Bid amount must be more than the highest bid!", 400),
+}
+
+
+def wants_watchlist(request) -> bool:
+    # Feeds requested with ?watchlist=false leave the flags out (null), so they
+    # are the same for every client. The frontend overlays /watchlist/ids instead.
+    return request.args.get("watchlist", "true").lower() not in ("false", "0")
+
+
+def is_shared_feed(request) -> bool:
+    if not wants_watchlist(request):
+        return True
+    headers = request.headers
+    return not (headers.get("Authorization") or headers.get("guestuserid"))
+
+
+def feed_cache_control(request) -> str:
+    # Feeds with watchlist flags are personal, even the anonymous ones
+    if wants_watchlist(request):
+        return "private, no-cache"
+    return "public, no-cache"
+
+
+def feed_listings(payload):
+    return payload["data"]
+
+
+def detail_listings(payload):
+    data = payload["data"]
+    return [data["listing"], *data["related_listings"]]
+
+
+async def get_feed_watchlist_ids(request, db, client, listings):
+    if not wants_watchlist(request):
+        return None
+    return await watchlist_manager.get_listing_ids_by_client_id(
+        db, client.id, [listing.id for listing in listings]
+    )
+
 
 class ListingsView(HTTPMethodView):
     @openapi.definition(
         summary="Retrieve all listings",
         description="This endpoint retrieves all listings",
-        response=ResBody(ListingsResponseSchema),
-        parameter={"name": "quantity", "location": "query", "schema": int},
+        response=ResBody(PaginatedListingsResponseSchema),
+        parameter=[
+            {
+                "name": "limit",
+                "location": "query",
+                "schema": int,
+                "description": "Page size, 50 by default and at most 100",
+            },
+            {
+                "name": "cursor",
+                "location": "query",
+                "schema": str,
+                "description": "The next_cursor of the previous page",
+            },
+            {"name": "quantity", "location": "query", "schema": int},
+            {"name": "watchlist", "location": "query", "schema": bool},
+        ],
     )
     @openapi.secured("token", "guest")
+    @cache_control(feed_cache_control)
+    @response_cache.cached(
+        LISTINGS, CATEGORIES, shared=is_shared_feed, countdowns=feed_listings
+    )
     async def get(self, request, db: AsyncSession, client: Client, **kwargs):
-        quantity = validate_quantity(request.args.get("quantity"))
-        listings = await listing_manager.get_all(db)
-        if quantity:
-            # Retrieve based on amount
-            listings = listings[:quantity]
-
-        data = [
-            ListingDataSchema(
-                watchlist=True
-                if await watchlist_manager.get_by_client_id_and_listing_id(
-                    db, client.id, listing.id
-                )
-                else False,
-                time_left_seconds=listing.time_left_seconds,
-                **listing.__dict__
-            ).dict()
-            for listing in listings
-        ]
-        return CustomResponse.success(message="Listings fetched", data=data)
+        cursor, limit = get_pagination_params(request)
+        listings = await listing_reader.get_all(db, cursor, limit + 1)
+        listings, next_cursor = paginate(listings, limit)
+
+        watchlist_ids = await get_feed_watchlist_ids(request, db, client, listings)
+        data = serialize_listings(listings, watchlist_ids)
+        return CustomResponse.success(
+            message="Listings fetched", data=data, next_cursor=next_cursor
+        )
 
 
 class ListingDetailView(HTTPMethodView):
@@ -70,22 +146,20 @@ class ListingDetailView(HTTPMethodView):
         response=ResBody(ListingResponseSchema),
     )
     @openapi.secured("token", "guest")
+    @cache_control("public, no-cache")
+    @response_cache.cached(LISTINGS, CATEGORIES, countdowns=detail_listings)
     async def get(self, request, db: AsyncSession, **kwargs):
         slug = kwargs["slug"]
-        listing = await listing_manager.get_by_slug(db, slug)
+        listing, related_listings, _ = await listing_manager.get_detail_by_slug(
+            db, slug, related_limit=3
+        )
         if not listing:
             return CustomResponse.error("Listing does not exist!", status_code=404)
 
-        related_listings = (
-            await listing_manager.get_related_listings(db, listing.category_id, slug)
-        )[:3]
-        data = ListingDetailDataSchema(
-            listing=ListingDataSchema.from_orm(listing),
-            related_listings=[
-                ListingDataSchema.from_orm(related_listing)
-                for related_listing in related_listings
-            ],
-        ).dict()
+        data = {
+            "listing": listing_serializer.one(listing),
+            "related_listings": listing_serializer.many(related_listings),
+        }
         return CustomResponse.success(message="Listing details fetched", data=data)
 
 
@@ -97,15 +171,8 @@ class ListingsByWatchListView(HTTPMethodView):
     )
     @openapi.secured("token", "guest")
     async def get(self, request, db: AsyncSession, client: Client, **kwargs):
-        watchlists = await watchlist_manager.get_by_client_id(db, client.id)
-        data = [
-            ListingDataSchema(
-                watchlist=True,
-                time_left_seconds=watchlist.listing.time_left_seconds,
-                **watchlist.listing.__dict__
-            ).dict()
-            for watchlist in watchlists
-        ]
+        listings = await listing_reader.get_watched(db, client.id)
+        data = serialize_listings(listings, {listing.id for listing in listings})
         return CustomResponse.success(message="Watchlists Listings fetched", data=data)
 
     @openapi.definition(
@@ -118,33 +185,34 @@ class ListingsByWatchListView(HTTPMethodView):
     @validate_request(AddOrRemoveWatchlistSchema)
     async def post(self, request, db: AsyncSession, client: Client, **kwargs):
         data = kwargs["data"]
-        client_id = client.id
         slug = data["slug"]
 
         listing = await listing_manager.get_by_slug(db, slug)
         if not listing:
             return CustomResponse.error("Listing does not exist!", status_code=404)
 
-        data_entry = {"session_key": client_id, "listing_id": listing.id}
-        if client.is_authenticated:
-            # Here we know its an auth user and not a guest, now we can retrieve id.
-            del data_entry["session_key"]
-            data_entry["user_id"] = client_id
-
         watchlist = await watchlist_manager.get_by_client_id_and_listing_id(
-            db, client_id, listing.id
+            db, client.id, listing.id
         )
 
         resp_message = "Listing removed from user watchlist"
         status_code = 200
         if not watchlist:
-            await watchlist_manager.create(db, data_entry)
+            if client.is_authenticated:
+                data_entry = {"user_id": client.id, "listing_id": listing.id}
+            else:
+                # The guest user row is only created once it has something to keep
+                client = await guestuser_manager.get_or_create(
+                    db, client.id, commit=False
+                )
+                data_entry = {"session_key": client.id, "listing_id": listing.id}
+            await watchlist_manager.create(db, data_entry, commit=False)
             resp_message = "Listing added to user watchlist"
             status_code = 201
         else:
-            await watchlist_manager.delete(db, watchlist)
+            await watchlist_manager.delete(db, watchlist, commit=False)
 
-        guestuser_id = client_id if not client.is_authenticated else None
+        guestuser_id = client.id if not client.is_authenticated else None
         return CustomResponse.success(
             message=resp_message,
             data={"guestuser_id": guestuser_id},
@@ -152,6 +220,23 @@ class ListingsByWatchListView(HTTPMethodView):
         )
 
 
+class WatchlistIdsView(HTTPMethodView):
+    @openapi.definition(
+        summary="Retrieve the ids of listings in a users watchlist",
+        description="This endpoint retrieves the ids of all listings in a user or guest watchlist, to flag listings in feeds requested with watchlist=false.",
+        response=ResBody(WatchlistIdsResponseSchema),
+    )
+    @openapi.secured("token", "guest")
+    @cache_control("private, no-cache")
+    async def get(self, request, db: AsyncSession, client: Client, **kwargs):
+        listing_ids = await watchlist_manager.get_listing_ids_by_client_id(
+            db, client.id
+        )
+        return CustomResponse.success(
+            message="Watchlist ids fetched", data=list(listing_ids)
+        )
+
+
 class CategoryListView(HTTPMethodView):
     @openapi.definition(
         summary="Retrieve all categories",
@@ -159,6 +244,8 @@ class CategoryListView(HTTPMethodView):
         response=ResBody(CategoriesResponseSchema),
     )
     @openapi.secured("token", "guest")
+    @cache_control("public, max-age=60")
+    @response_cache.cached(CATEGORIES)
     async def get(self, request, db: AsyncSession, **kwargs):
         categories = await category_manager.get_all(db)
         data = [CategoryDataSchema.from_orm(category).dict() for category in categories]
@@ -169,9 +256,28 @@ class ListingsByCategoryView(HTTPMethodView):
     @openapi.definition(
         summary="Retrieve all listings by category",
         description="This endpoint retrieves all listings in a particular category. Use slug 'other' for category other",
-        response=ResBody(ListingsResponseSchema),
+        response=ResBody(PaginatedListingsResponseSchema),
+        parameter=[
+            {
+                "name": "limit",
+                "location": "query",
+                "schema": int,
+                "description": "Page size, 50 by default and at most 100",
+            },
+            {
+                "name": "cursor",
+                "location": "query",
+                "schema": str,
+                "description": "The next_cursor of the previous page",
+            },
+            {"name": "watchlist", "location": "query", "schema": bool},
+        ],
     )
     @openapi.secured("token", "guest")
+    @cache_control(feed_cache_control)
+    @response_cache.cached(
+        LISTINGS, CATEGORIES, shared=is_shared_feed, countdowns=feed_listings
+    )
     async def get(self, request, db: AsyncSession, client: Client, **kwargs):
         slug = kwargs.get("slug")
         # listings with category 'other' have category column as null
@@ -181,20 +287,14 @@ class ListingsByCategoryView(HTTPMethodView):
             if not category:
                 return CustomResponse.error("Invalid category", status_code=404)
 
-        listings = await listing_manager.get_by_category(db, category)
-        data = [
-            ListingDataSchema(
-                watchlist=True
-                if await watchlist_manager.get_by_client_id_and_listing_id(
-                    db, client.id, listing.id
-                )
-                else False,
-                time_left_seconds=listing.time_left_seconds,
-                **listing.__dict__
-            ).dict()
-            for listing in listings
-        ]
-        return CustomResponse.success(message="Category Listings fetched", data=data)
+        cursor, limit = get_pagination_params(request)
+        listings = await listing_reader.get_by_category(db, category, cursor, limit + 1)
+        listings, next_cursor = paginate(listings, limit)
+        watchlist_ids = await get_feed_watchlist_ids(request, db, client, listings)
+        data = serialize_listings(listings, watchlist_ids)
+        return CustomResponse.success(
+            message="Category Listings fetched", data=data, next_cursor=next_cursor
+        )
 
 
 class BidsView(HTTPMethodView):
@@ -204,19 +304,33 @@ class BidsView(HTTPMethodView):
         response=ResBody(BidsResponseSchema),
     )
     @openapi.secured("token", "guest")
+    @cache_control("public, no-cache")
     async def get(self, request, db: AsyncSession, **kwargs):
         slug = kwargs["slug"]
-        listing = await listing_manager.get_by_slug(db, slug)
-        if not listing:
+        # Polls for unchanged bids are answered from one indexed lookup
+        summary = await listing_manager.get_bid_summary_by_slug(db, slug)
+        if not summary:
             return CustomResponse.error("Listing does not exist!", status_code=404)
+        etag = CustomResponse.make_etag(
+            "bids",
+            slug,
+            summary.updated_at,
+            summary.bids_count,
+            summary.bidders_updated_at,
+        )
+        if CustomResponse.etag_matches(request, etag):
+            return CustomResponse.not_modified(etag)
 
-        bids = (await bid_manager.get_by_listing_id(db, listing.id))[:3]
+        listing, _, bids = await listing_manager.get_detail_by_slug(
+            db, slug, bids_limit=3
+        )
+        if not listing:
+            return CustomResponse.error("Listing does not exist!", status_code=404)
 
-        data = BidsResponseDataSchema(
-            listing=listing.name,
-            bids=[BidDataSchema.from_orm(bid) for bid in bids],
-        ).dict()
-        return CustomResponse.success(message="Listing Bids fetched", data=data)
+        data = {"listing": listing.name, "bids": bid_serializer.many(bids)}
+        response = CustomResponse.success(message="Listing Bids fetched", data=data)
+        response.headers["ETag"] = etag
+        return response
 
     @openapi.definition(
         body=ReqBody(CreateBidSchema),
@@ -230,52 +344,105 @@ class BidsView(HTTPMethodView):
         slug = kwargs.get("slug")
         data = kwargs.get("data")
 
-        listing = await listing_manager.get_by_slug(db, slug)
-        if not listing:
-            return CustomResponse.error("Listing does not exist!", status_code=404)
-
-        amount = data["amount"]
-        bids_count = listing.bids_count
-        if user.id == listing.auctioneer_id:
-            return CustomResponse.error(
-                "You cannot bid your own product!", status_code=403
-            )
-        elif not listing.active:
-            return CustomResponse.error("This auction is closed!", status_code=410)
-        elif listing.time_left < 1:
-            return CustomResponse.error(
-                "This auction is expired and closed!", status_code=410
-            )
-        elif amount < listing.price:
-            return CustomResponse.error(
-                "Bid amount cannot be less than the bidding price!"
-            )
-        elif amount <= listing.highest_bid:
-            return CustomResponse.error("Bid amount must be more than the highest bid!")
-
-        bid = await bid_manager.get_by_user_and_listing_id(db, user.id, listing.id)
-        if bid:
-            bid = await bid_manager.update(db, bid, {"amount": amount})
-        else:
-            bids_count += 1
-            bid = await bid_manager.create(
-                db,
-                {"user_id": user.id, "listing_id": listing.id, "amount": amount},
-            )
-
-        # Update bids count and highest bids
-        await listing_manager.update(
-            db, listing, {"highest_bid": amount, "bids_count": bids_count}
+        outcome, bid, _ = await bid_manager.place_bid(
+            db, slug, user, data["amount"], commit=False
         )
-        data = BidDataSchema.from_orm(bid).dict()
+        if outcome != BidOutcome.PLACED:
+            message, status_code = BID_ERRORS[outcome]
+            return CustomResponse.error(message, status_code=status_code)
+
+        data = bid_serializer.one(bid)
         return CustomResponse.success(
             message="Bid added to listing", data=data, status_code=201
         )
 
 
+@listings_router.signal(BID_PLACED)
+async def push_bid(app, data, **kwargs):
+    # Bids placed on any worker reach the websocket subscribers of this one
+    slug = data["slug"]
+    if not bid_hub.has_subscribers(slug):
+        return
+
+    async with app.ctx.SessionLocal() as db:
+        bid = await bid_manager.get_by_id(db, UUID(data["bid_id"]), *bid_card())
+        event = {
+            "type": "bid",
+            "highest_bid": float(data["highest_bid"]),
+            "bids_count": data["bids_count"],
+            "bid": bid_serializer.one(bid) if bid else None,
+        }
+    bid_hub.publish(slug, ujson.dumps(event))
+
+
+@listings_router.signal(LISTING_UPDATED)
+async def schedule_closing(data, **kwargs):
+    closing_date = data.get("closing_date")
+    if closing_date:
+        auction_scheduler.schedule(datetime.fromisoformat(closing_date))
+
+
+@listings_router.signal(EVENTS_LOST)
+async def reload_closings(**kwargs):
+    auction_scheduler.reload()
+
+
+@listings_router.signal(BID_PLACED)
+@listings_router.signal(LISTING_UPDATED)
+@listings_router.signal(LISTING_CLOSED)
+@listings_router.signal(USER_UPDATED)
+async def drop_cached_listings(**kwargs):
+    # Listings show bids, their state and their auctioneer's name and avatar
+    await response_cache.invalidate(LISTINGS)
+
+
+async def watch_disconnect(ws, subscription):
+    # Incoming messages are ignored, this only notices the client going away
+    try:
+        async for _ in ws:
+            pass
+    except ConnectionClosed:
+        pass
+    finally:
+        subscription.close()
+
+
+async def bid_feed(request, ws, slug):
+    # Pushes the highest bid and bids count of a listing whenever a bid is placed
+    subscription = bid_hub.subscribe(slug)
+    reader = asyncio.create_task(watch_disconnect(ws, subscription))
+    try:
+        async with request.app.ctx.SessionLocal() as db:
+            summary = await listing_manager.get_bid_summary_by_slug(db, slug)
+        if not summary:
+            await ws.close(code=4004, reason="Listing does not exist!")
+            return
+
+        event = {
+            "type": "snapshot",
+            "highest_bid": float(summary.highest_bid),
+            "bids_count": summary.bids_count,
+            "bid": None,
+        }
+        await ws.send(ujson.dumps(event))
+        while True:
+            message = await subscription.get()
+            if message is None:
+                break
+            await ws.send(message)
+
+        if subscription.evicted:
+            await ws.close(code=1013, reason="Too slow to keep up, please reconnect")
+    finally:
+        reader.cancel()
+        bid_hub.unsubscribe(subscription)
+
+
 listings_router.add_route(ListingsView.as_view(), "/")
 listings_router.add_route(ListingDetailView.as_view(), "/detail/<slug>")
 listings_router.add_route(ListingsByWatchListView.as_view(), "/watchlist")
+listings_router.add_route(WatchlistIdsView.as_view(), "/watchlist/ids")
 listings_router.add_route(CategoryListView.as_view(), "/categories")
 listings_router.add_route(ListingsByCategoryView.as_view(), "/categories/<slug>")
 listings_router.add_route(BidsView.as_view(), "/detail/<slug>/bids")
+listings_router.add_websocket_route(bid_feed, "/detail/<slug>/ws")
@@ -7,7 +7,7 @@ from .base import ResponseSchema
 
 from app.api.utils.file_types import ALLOWED_IMAGE_TYPES
 from app.api.utils.file_processors import FileProcessor
-from pytz import UTC
+from app.common.dates import to_naive_utc
 from decimal import Decimal
 
 # CREATE LISTING #
@@ -23,7 +23,8 @@ class CreateListingSchema(BaseModel):
 
     @validator("closing_date")
     def validate_closing_date(cls, v):
-        if datetime.utcnow().replace(tzinfo=UTC) > v:
+        v = to_naive_utc(v)
+        if v and datetime.utcnow() > v:
             raise ValueError("Closing date must be beyond the current datetime!")
         return v
 
@@ -56,7 +57,8 @@ class UpdateListingSchema(BaseModel):
 
     @validator("closing_date")
     def validate_closing_date(cls, v):
-        if datetime.utcnow().replace(tzinfo=UTC) > v:
+        v = to_naive_utc(v)
+        if v and datetime.utcnow() > v:
             raise ValueError("Closing date must be beyond the current datetime!")
         return v
 
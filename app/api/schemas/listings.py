@@ -95,6 +95,14 @@ class ListingsResponseSchema(ResponseSchema):
     data: List[ListingDataSchema]
 
 
+class PaginatedListingsResponseSchema(ListingsResponseSchema):
+    next_cursor: Optional[str] = Field(None, example="Pass as cursor for next page")
+
+
+class WatchlistIdsResponseSchema(ResponseSchema):
+    data: List[UUID]
+
+
 # ------------------------------------------------------ #
 
 
@@ -1,6 +1,5 @@
-from sanic import Request
 from sanic_testing.testing import SanicASGITestClient
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from app.main import app
 from app.db.models.base import Base
@@ -15,11 +14,139 @@ from pytest_postgresql import factories
 from pytest_postgresql.janitor import DatabaseJanitor
 from httpx import AsyncClient
 from datetime import datetime, timedelta
-import pytest, asyncio
+import pytest, asyncio, time
 
 test_db = factories.postgresql_proc(port=None, dbname="test_db")
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark", action="store_true", help="Run tests marked as benchmarks"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    # Timings depend on the machine, so benchmarks don't run with the suite
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="Benchmark, run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+class SMTPStandIn:
+    """Minimal local SMTP server that accepts any login and records messages"""
+
+    def __init__(self):
+        self.port = None
+        self.connections = 0
+        self.messages = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 localhost ESMTP\r\n")
+        lines = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if lines is not None:  # Reading message data
+                if line == b".\r\n":
+                    self.messages.append(b"".join(lines))
+                    lines = None
+                    writer.write(b"250 OK\r\n")
+                else:
+                    lines.append(line)
+                continue
+
+            command = line[:4].upper()
+            if command == b"EHLO":
+                writer.write(b"250-localhost\r\n250 AUTH PLAIN LOGIN\r\n")
+            elif command == b"AUTH":
+                writer.write(b"235 Authentication successful\r\n")
+            elif command == b"DATA":
+                lines = []
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+
+class RedisStandIn:
+    """Minimal local Redis-protocol server with the commands the cache uses"""
+
+    def __init__(self):
+        self.port = None
+        self.data = {}  # key -> (value, expires_at)
+
+    def lookup(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key)
+            return None
+        return value
+
+    def reply(self, value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, (set, list)):
+            return b"*%d\r\n" % len(value) + b"".join(map(self.reply, value))
+        return b"$%d\r\n%b\r\n" % (len(value), value)
+
+    def run(self, command, *args):
+        command = command.upper()
+        if command in (b"AUTH", b"SELECT", b"PING"):
+            return b"+OK\r\n"
+        if command == b"GET":
+            return self.reply(self.lookup(args[0]))
+        if command == b"SET":
+            expires_at = None
+            if len(args) == 4 and args[2].upper() == b"PX":
+                expires_at = time.monotonic() + int(args[3]) / 1000
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return self.reply(sum(self.data.pop(key, None) is not None for key in args))
+        if command == b"SADD":
+            members = self.lookup(args[0]) or set()
+            added = len(set(args[1:]) - members)
+            self.data[args[0]] = (members | set(args[1:]), None)
+            return self.reply(added)
+        if command == b"SMEMBERS":
+            return self.reply(self.lookup(args[0]) or set())
+        if command == b"PEXPIRE":
+            value = self.lookup(args[0])
+            if value is None:
+                return self.reply(0)
+            self.data[args[0]] = (value, time.monotonic() + int(args[1]) / 1000)
+            return self.reply(1)
+        return b"-ERR unknown command\r\n"
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:-2])):
+                    size = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(size + 2))[:-2])
+                writer.write(self.run(*args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        writer.close()
+
+
 @pytest.fixture(scope="session")
 def event_loop():
     """Overrides pytest default function scoped event loop"""
@@ -59,21 +186,38 @@ async def database(engine):
         yield db
 
 
-def get_db(request: Request):
-    return request.app.ctx.db_conn
-
-
 @pytest.fixture
-async def client(database):
+async def client(engine, database):
     @app.before_server_start
     async def override_db(app, _):
-        app.ctx.db_conn = database
-        app.ext.add_dependency(AsyncSession, get_db)
+        await app.ctx.engine.dispose()
+        app.ctx.engine = engine
+        app.ctx.SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
 
     async with SanicASGITestClient(app) as client:
         yield client
 
 
+@pytest.fixture
+async def smtp_server():
+    stand_in = SMTPStandIn()
+    server = await asyncio.start_server(stand_in.handle, "127.0.0.1", 0)
+    stand_in.port = server.sockets[0].getsockname()[1]
+    yield stand_in
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.fixture
+async def redis_server():
+    stand_in = RedisStandIn()
+    server = await asyncio.start_server(stand_in.handle, "127.0.0.1", 0)
+    stand_in.port = server.sockets[0].getsockname()[1]
+    yield stand_in
+    server.close()
+    await server.wait_closed()
+
+
 @pytest.fixture
 async def test_user(database):
     user_dict = {
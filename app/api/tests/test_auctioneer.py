@@ -1,7 +1,7 @@
 from app.db.managers.accounts import jwt_manager
 from app.db.managers.listings import category_manager, bid_manager
 from app.api.utils.tokens import create_access_token, create_refresh_token
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pytz import UTC
 import mock
 
@@ -164,6 +164,27 @@ async def test_auctioneer_update_listing(authorized_client, create_listing):
     # You can also test for invalid users yourself.....
 
 
+async def test_auctioneer_update_listing_with_offset_closing_date(
+    authorized_client, create_listing, database
+):
+    listing = create_listing["listing"]
+    closing_date = (datetime.utcnow() + timedelta(days=1)).replace(microsecond=0)
+    offset = timezone(timedelta(hours=1))
+
+    # Verify that an offset-bearing closing date is stored as naive UTC
+    _, response = await authorized_client.patch(
+        f"{BASE_URL_PATH}/listings/{listing.slug}",
+        json={
+            "closing_date": closing_date.replace(tzinfo=UTC)
+            .astimezone(offset)
+            .isoformat()
+        },
+    )
+    assert response.status_code == 200
+    listing = await database.get(type(listing), listing.pkid, populate_existing=True)
+    assert listing.closing_date == closing_date
+
+
 async def test_auctioneer_listings_bids(
     authorized_client, create_listing, another_verified_user, database
 ):
@@ -1,6 +1,18 @@
 from app.db.managers.accounts import user_manager, jwt_manager, otp_manager
+from app.db.managers.base import guestuser_manager
+from app.db.managers.listings import watchlist_manager
+from app.db.models.accounts import Jwt, Otp
+from app.db.models.base import GuestUser
+from app.api.utils.janitor import Janitor
 from app.api.utils.tokens import create_refresh_token
-import mock
+from app.common.exception_handlers import sanic_exceptions_handler
+from app.core.security import PasswordHasher, get_password_hash, verify_password
+from app.db import transactions
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sanic import SanicException
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import asyncio, mock, pytest, threading
 
 BASE_URL_PATH = "/api/v2/auth"
 
@@ -154,6 +166,26 @@ async def test_login(client, test_user, database):
     }
 
 
+async def test_login_without_guest_header(
+    client, create_listing, another_verified_user, database
+):
+    # Another user's watchlist, its session_key is NULL
+    listing_id = create_listing["listing"].id
+    await watchlist_manager.create(
+        database, {"user_id": another_verified_user.id, "listing_id": listing_id}
+    )
+
+    # Verify that logging in without a guest id copies no one's watchlist
+    user = create_listing["user"]
+    _, response = await client.post(
+        f"{BASE_URL_PATH}/login",
+        json={"email": user.email, "password": "testpassword"},
+    )
+    assert response.status_code == 201
+    assert await watchlist_manager.get_by_user_id(database, user.id) == []
+    assert await watchlist_manager.get_by_session_key(database, None, user.id) == []
+
+
 async def test_refresh_token(client, database, verified_user):
     jwt_obj = await jwt_manager.create(
         database,
@@ -292,6 +324,14 @@ async def test_logout(authorized_client):
         "message": "Logout successful",
     }
 
+    # Ensures the logged out token is no longer accepted (even if cached)
+    _, response = await authorized_client.get(f"{BASE_URL_PATH}/logout")
+    assert response.status_code == 401
+    assert response.json == {
+        "status": "failure",
+        "message": "Auth Token is invalid or expired",
+    }
+
     # Ensures if unauthorized user cannot log out
     _, response = await authorized_client.get(
         f"{BASE_URL_PATH}/logout", headers={"Authorization": "invalid_token"}
@@ -301,3 +341,131 @@ async def test_logout(authorized_client):
         "status": "failure",
         "message": "Auth Token is invalid or expired",
     }
+
+
+async def test_janitor_deletes_expired_rows(
+    engine, database, verified_user, another_verified_user
+):
+    old = datetime.utcnow() - timedelta(days=365)
+    for user in (verified_user, another_verified_user):
+        await otp_manager.create(database, {"user_id": user.id})
+        await jwt_manager.create(
+            database, {"user_id": user.id, "access": "access", "refresh": "refresh"}
+        )
+    idle_guest = await guestuser_manager.create(database, {})
+    active_guest = await guestuser_manager.create(database, {})
+
+    # Age one of each
+    for model, id_column, id in (
+        (Otp, Otp.user_id, verified_user.id),
+        (Jwt, Jwt.user_id, verified_user.id),
+        (GuestUser, GuestUser.id, idle_guest.id),
+    ):
+        await database.execute(
+            update(model).where(id_column == id).values(updated_at=old)
+        )
+    await database.commit()
+
+    janitor = Janitor(batch_size=1)
+    run = await janitor.run_once(async_sessionmaker(engine, expire_on_commit=False))
+    assert {name: run[name]["deleted"] for name in janitor.deleted} == {
+        "guestusers": 1,
+        "otps": 1,
+        "jwts": 1,
+    }
+    assert [guest.id for guest in await guestuser_manager.get_all(database)] == [
+        active_guest.id
+    ]
+    assert await otp_manager.get_by_user_id(database, verified_user.id) is None
+    assert await jwt_manager.get_by_user_id(database, another_verified_user.id)
+
+
+async def test_browsing_guest_is_not_idle(client, database):
+    old = datetime.utcnow() - timedelta(days=365)
+    guest = await guestuser_manager.create(database, {})
+    await database.execute(
+        update(GuestUser).where(GuestUser.id == guest.id).values(updated_at=old)
+    )
+    await database.commit()
+
+    # Verify that a read by the guest marks it as seen, so it isn't deleted
+    _, response = await client.get(
+        "/api/v2/listings/watchlist", headers={"guestuserid": str(guest.id)}
+    )
+    assert response.status_code == 200
+    assert await guestuser_manager.delete_idle(database, limit=10) == 0
+
+    # Verify that the guest isn't written again on every request
+    with mock.patch.object(guestuser_manager, "seen") as seen:
+        seen.get.return_value = True
+        execute = mock.AsyncMock()
+        await guestuser_manager.mark_seen(mock.Mock(execute=execute), guest.id)
+        execute.assert_not_awaited()
+
+
+async def test_unit_of_work_commits_once(database, verified_user):
+    user_id = verified_user.id  # The rollback expires the fixture's attributes
+    with mock.patch("app.common.events.event_bus.publish") as publish_mock:
+        await jwt_manager.create(
+            database,
+            {"user_id": user_id, "access": "access", "refresh": "refresh"},
+            commit=False,
+        )
+        await user_manager.update(
+            database, verified_user, {"first_name": "B"}, commit=False
+        )
+
+        # Nothing is published before the writes are committed
+        assert publish_mock.call_count == 0
+        await transactions.rollback(database)
+        assert publish_mock.call_count == 0
+        assert await jwt_manager.get_by_user_id(database, user_id) is None
+
+        user = await user_manager.get_by_id(database, user_id)
+        await otp_manager.create(database, {"user_id": user_id}, commit=False)
+        await user_manager.update(database, user, {"first_name": "C"}, commit=False)
+        await transactions.commit(database)
+        assert publish_mock.call_count == 1
+        assert await otp_manager.get_by_user_id(database, user_id)
+
+
+async def test_password_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(max_workers=1, max_queue=1, reject_when_saturated=True)
+    release = threading.Event()
+
+    def hash_slowly():
+        release.wait(5)
+        return "hashed"
+
+    # One hash takes the only worker and another one waits for it
+    running = asyncio.create_task(hasher.run(hash_slowly))
+    while not hasher.running:
+        await asyncio.sleep(0)
+    queued = asyncio.create_task(hasher.run(hash_slowly))
+    while not hasher.queued:
+        await asyncio.sleep(0)
+
+    # Verify that a full queue turns the next hash away with a 503
+    with pytest.raises(SanicException) as exc_info:
+        await hasher.run(hash_slowly)
+    assert exc_info.value.status_code == 503
+    assert sanic_exceptions_handler(None, exc_info.value).status == 503
+    assert hasher.metrics()["rejected"] == 1
+
+    release.set()
+    assert await asyncio.gather(running, queued) == ["hashed", "hashed"]
+    hasher.shutdown()
+
+
+async def test_password_hasher_metrics():
+    hasher = PasswordHasher(max_workers=2, max_queue=10, reject_when_saturated=False)
+    assert hasher.metrics()["completed"] == 0
+
+    # Verify that hashes run on the pool and are counted
+    hashed = await hasher.run(get_password_hash, "password")
+    assert await hasher.run(verify_password, "password", hashed)
+    metrics = hasher.metrics()
+    assert metrics["completed"] == 2
+    assert metrics["queue_depth"] == metrics["running"] == metrics["rejected"] == 0
+    assert metrics["max_wait_seconds"] >= metrics["avg_wait_seconds"] >= 0
+    hasher.shutdown()
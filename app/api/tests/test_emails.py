@@ -0,0 +1,92 @@
+from email import message_from_bytes
+from email.mime.text import MIMEText
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.main import env
+from app.api.utils.emails import EmailOutboxDispatcher, send_email
+from app.api.utils.mailers import EmailDeliveryService
+from app.db.managers.accounts import email_outbox_manager, otp_manager
+from app.db.models.accounts import EmailOutbox
+import asyncio, socket
+
+
+def build_message(subject):
+    message = MIMEText("<p>Hello</p>", "html")
+    message["From"] = "sender@example.com"
+    message["To"] = "receiver@example.com"
+    message["Subject"] = subject
+    return message
+
+
+async def test_email_delivery_reuses_connection(smtp_server):
+    delivery = EmailDeliveryService(
+        hostname="127.0.0.1",
+        port=smtp_server.port,
+        username="sender@example.com",
+        password="password",
+        use_tls=False,
+        pool_size=1,
+    )
+
+    # Verify that queued emails are all delivered over one persistent connection
+    futures = [await delivery.send(build_message(f"Email {i}")) for i in range(5)]
+    assert await asyncio.gather(*futures) == [True] * 5
+    await delivery.stop()
+    assert len(smtp_server.messages) == 5
+    assert smtp_server.connections == 1
+
+
+async def test_email_delivery_gives_up_after_retries():
+    # Reserve a port with nothing listening on it
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    delivery = EmailDeliveryService(
+        hostname="127.0.0.1",
+        port=port,
+        use_tls=False,
+        max_retries=2,
+        retry_backoff=0,
+    )
+
+    # Verify that an undeliverable email is retried and then reported as failed
+    future = await delivery.send(build_message("Undeliverable"))
+    assert await future is False
+    await delivery.stop()
+    assert delivery.metrics()["retried"] == 2
+    assert delivery.metrics()["failed"] == 1
+
+
+async def test_email_outbox_dispatch(engine, database, test_user, smtp_server):
+    delivery = EmailDeliveryService(
+        hostname="127.0.0.1", port=smtp_server.port, use_tls=False
+    )
+    dispatcher = EmailOutboxDispatcher(delivery)
+    SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    # Verify that sending an email only records it in the outbox, code included
+    await send_email(None, database, test_user, "activate")
+    email = (await email_outbox_manager.get_all(database))[0]
+    otp = await otp_manager.get_by_user_id(database, test_user.id)
+    assert email.status == EmailOutbox.PENDING
+    assert email.otp == otp.code
+    assert len(smtp_server.messages) == 0
+
+    # Verify that the dispatcher delivers it and marks it sent
+    assert await dispatcher.dispatch_batch(SessionLocal, env) == 1
+    await delivery.stop()
+    assert len(smtp_server.messages) == 1
+    email = await database.get(EmailOutbox, email.pkid, populate_existing=True)
+    assert email.status == EmailOutbox.SENT
+    assert email.attempts == 1
+
+    # Verify that delivering it sent the queued code and left it valid
+    message = message_from_bytes(smtp_server.messages[0])
+    html = message.get_payload()[0].get_payload(decode=True).decode()
+    assert str(otp.code) in html
+    otp = await database.get(type(otp), otp.pkid, populate_existing=True)
+    assert otp.code == email.otp
+
+    # Verify that a sent email is not claimed again
+    assert await dispatcher.dispatch_batch(SessionLocal, env) == 0
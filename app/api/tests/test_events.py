@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+from app.common.events import EventBus, TOKEN_REVOKED
+import asyncio
+
+
+class Worker:
+    """Stands in for the Sanic app of one worker, recording dispatched signals"""
+
+    def __init__(self, engine):
+        self.ctx = SimpleNamespace(engine=engine)
+        self.events = []
+
+    async def dispatch(self, event, context=None, **kwargs):
+        self.events.append((event, context["data"]))
+
+
+async def test_event_bus_reaches_other_workers(engine):
+    worker, other_worker = Worker(engine), Worker(engine)
+    bus, other_bus = EventBus("test_events"), EventBus("test_events")
+    await bus.start(worker)
+    await other_bus.start(other_worker)
+    await asyncio.sleep(0.5)  # Let both listeners connect
+
+    try:
+        data = {"user_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6"}
+        await bus.publish(TOKEN_REVOKED, data)
+
+        # Verify that the publishing worker dispatched it right away, and only once
+        for _ in range(50):
+            if other_worker.events:
+                break
+            await asyncio.sleep(0.1)
+        assert worker.events == [(TOKEN_REVOKED, data)]
+
+        # Verify that the other worker received it through NOTIFY
+        assert other_worker.events == [(TOKEN_REVOKED, data)]
+        assert other_bus.metrics()["received"] == 1
+    finally:
+        await bus.stop()
+        await other_bus.stop()
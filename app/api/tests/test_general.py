@@ -1,4 +1,11 @@
+from app.api.utils.file_processors import FileProcessor, file_url_cache
+from app.api.utils.response_cache import REVIEWS, ResponseCache
+from app.common.caches import MemoryBackend, RedisBackend
+from app.common.responses import CustomResponse
 from app.db.managers.general import review_manager
+from types import SimpleNamespace
+from uuid import uuid4
+import asyncio
 import pytest
 import mock
 
@@ -46,3 +53,84 @@ async def test_retrieve_reviews(client, verified_user, database):
         "message": "Reviews fetched",
         "data": [{"reviewer": mock.ANY, "text": "This is a nice platform"}],
     }
+
+
+def test_generate_file_url_is_memoized():
+    file_url_cache.clear()
+    key = uuid4()
+    url = FileProcessor.generate_file_url(
+        key=key, folder="listings", content_type="image/png"
+    )
+    assert url.endswith(f"listings/{key}.png")
+    assert file_url_cache.misses == 1
+
+    hits = file_url_cache.hits
+    for _ in range(3):
+        assert (
+            FileProcessor.generate_file_url(
+                key=key, folder="listings", content_type="image/png"
+            )
+            == url
+        )
+    assert file_url_cache.hits == hits + 3
+    assert len(file_url_cache) == 1
+
+
+def cache_request(path, headers={}):
+    SessionLocal = mock.MagicMock(return_value=mock.AsyncMock())
+    app = SimpleNamespace(ctx=SimpleNamespace(SessionLocal=SessionLocal))
+    return SimpleNamespace(
+        method="GET", path=path, query_args=[], headers=headers, app=app
+    )
+
+
+async def test_response_cache_revalidates_and_invalidates():
+    # Entries go stale as soon as they are stored
+    cache = ResponseCache(MemoryBackend(), ttl=-1, stale_ttl=60)
+    renders = []
+
+    @cache.cached(REVIEWS, shared=lambda request: not request.headers)
+    async def get(view, request, db, **kwargs):
+        renders.append(db)
+        return CustomResponse.success(message="Reviews fetched", data=len(renders))
+
+    request = cache_request(f"{BASE_URL_PATH}/reviews")
+    first = await get(None, request, db="request db")
+    assert first.headers["X-Cache"] == "MISS"
+
+    # The stale body is served while one background render replaces it
+    second = await get(None, request, db="request db")
+    third = await get(None, request, db="request db")
+    assert second.headers["X-Cache"] == third.headers["X-Cache"] == "STALE"
+    assert second.body == third.body == first.body
+    await asyncio.gather(*cache._tasks)
+    assert len(renders) == 2 and renders[1] != "request db"
+
+    cache.ttl = 60
+    await cache.invalidate(REVIEWS)
+    fourth = await get(None, request, db="request db")
+    fifth = await get(None, request, db="request db")
+    assert fourth.headers["X-Cache"] == "MISS"
+    assert fifth.headers["X-Cache"] == "HIT" and fifth.body == fourth.body
+    assert b'"data":3' in fifth.body
+
+    # Responses for a known client are never cached
+    guest = cache_request(f"{BASE_URL_PATH}/reviews", {"guestuserid": str(uuid4())})
+    response = await get(None, guest, db="request db")
+    assert "X-Cache" not in response.headers and len(renders) == 4
+
+
+async def test_redis_backend_with_stand_in(redis_server):
+    backend = RedisBackend(f"redis://:secret@127.0.0.1:{redis_server.port}/1")
+    await backend.set("listings", b"feed", ttl=60, tags=["listings", "categories"])
+    await backend.set("reviews", b"reviews", ttl=60, tags=["reviews"])
+    await backend.set("short", b"short", ttl=0.05, tags=[])
+    assert await backend.get("listings") == b"feed"
+
+    await backend.invalidate("categories")
+    await asyncio.sleep(0.1)
+    assert await backend.get("listings") is None
+    assert await backend.get("short") is None
+    assert await backend.get("reviews") == b"reviews"
+    assert backend.metrics()["hits"] == 2
+    await backend.close()
@@ -1,7 +1,43 @@
-from app.db.managers.accounts import jwt_manager
-from app.db.managers.listings import category_manager, watchlist_manager, bid_manager
+from app.api.routes.deps import get_client
+from app.db.managers.accounts import jwt_manager, otp_manager, user_manager
+from app.db.managers.base import guestuser_manager
+from app.db.managers.listings import (
+    category_manager,
+    listing_manager,
+    watchlist_manager,
+    bid_manager,
+    BidOutcome,
+)
 from app.api.utils.tokens import create_access_token, create_refresh_token
-import mock
+from app.api.schemas.listings import ListingDataSchema
+from app.api.routes.listings import feed_listings
+from app.api.utils.auctions import AuctionScheduler
+from app.api.utils.pagination import (
+    DEFAULT_PAGE_LIMIT,
+    MAX_PAGE_LIMIT,
+    get_pagination_params,
+)
+from app.api.utils.response_cache import LISTINGS, ResponseCache
+from app.api.utils.serializers import (
+    format_datetime,
+    is_active,
+    listing_card_serializer,
+    listing_serializer,
+    time_left_seconds,
+)
+from app.common.caches import MemoryBackend
+from app.common.responses import CustomResponse
+from app.db.loaders import listing_card
+from app.db.models.listings import Listing
+from app.db.readmodels import ListingCard, listing_reader
+from app.common.pubsub import PubSubHub
+from datetime import datetime, timedelta, timezone
+from pytz import UTC
+from sanic import SanicException
+from types import SimpleNamespace
+from uuid import uuid4
+from sqlalchemy import insert
+import asyncio, mock, orjson, pytest, time, tracemalloc
 
 BASE_URL_PATH = "/api/v2/listings"
 
@@ -18,6 +54,117 @@ async def test_retrieve_all_listings(client, create_listing):
     assert any(isinstance(obj["name"], str) for obj in data)
 
 
+async def test_listing_slugs_are_unique(create_listing, database):
+    listing = create_listing["listing"]
+    listing_dict = {
+        "auctioneer_id": listing.auctioneer_id,
+        "name": listing.name,
+        "desc": "Same name",
+        "price": 1000.00,
+        "closing_date": listing.closing_date,
+    }
+
+    # Verify that a taken slug gets a suffix instead of failing
+    same_name = await listing_manager.create(database, dict(listing_dict))
+    assert same_name.slug.startswith(f"{listing.slug}-")
+
+    # Verify that a rename onto a taken slug does the same
+    other = await listing_manager.create(database, {**listing_dict, "name": "Other"})
+    assert other.slug == "other"
+    other = await listing_manager.update(database, other, {"name": listing.name})
+    assert other.slug.startswith(f"{listing.slug}-")
+    assert other.slug != same_name.slug
+
+
+def test_pagination_params():
+    def params(**args):
+        return get_pagination_params(SimpleNamespace(args=args))
+
+    # Verify that pages are capped, and quantity=0 still means "unset"
+    assert params() == (None, DEFAULT_PAGE_LIMIT)
+    assert params(limit="500") == (None, MAX_PAGE_LIMIT)
+    assert params(quantity="0") == (None, DEFAULT_PAGE_LIMIT)
+    assert params(quantity="10") == (None, 10)
+    with pytest.raises(SanicException, match="Limit must be greater than 0"):
+        params(limit="0")
+
+
+async def test_retrieve_listings_with_cursor(client, create_listing, database):
+    listing = create_listing["listing"]
+    newer_listing = await listing_manager.create(
+        database,
+        {
+            "auctioneer_id": listing.auctioneer_id,
+            "name": "Newer Listing",
+            "desc": "Newer description",
+            "price": 1000.00,
+            "closing_date": listing.closing_date,
+        },
+    )
+
+    # Verify that the first page is limited in size and points to the next page
+    _, response = await client.get(f"{BASE_URL_PATH}", params={"limit": 1})
+    assert response.status_code == 200
+    json_resp = response.json
+    assert [obj["slug"] for obj in json_resp["data"]] == [newer_listing.slug]
+    assert json_resp["next_cursor"]
+
+    # Verify that the next page continues after the cursor
+    _, response = await client.get(
+        f"{BASE_URL_PATH}", params={"limit": 1, "cursor": json_resp["next_cursor"]}
+    )
+    assert response.status_code == 200
+    json_resp = response.json
+    assert [obj["slug"] for obj in json_resp["data"]] == [listing.slug]
+    assert json_resp["next_cursor"] is None
+
+    # Verify that an invalid cursor is rejected
+    _, response = await client.get(f"{BASE_URL_PATH}", params={"cursor": "invalid"})
+    assert response.status_code == 400
+    assert response.json == {"status": "failure", "message": "Invalid cursor"}
+
+
+async def test_retrieve_all_listings_with_watchlist_flag(
+    authorized_client, create_listing, database
+):
+    listing = create_listing["listing"]
+    await watchlist_manager.create(
+        database, {"user_id": create_listing["user"].id, "listing_id": listing.id}
+    )
+
+    # Verify that watched listings are flagged in the feed
+    _, response = await authorized_client.get(f"{BASE_URL_PATH}")
+    assert response.status_code == 200
+    data = response.json["data"]
+    assert [obj["watchlist"] for obj in data if obj["slug"] == listing.slug] == [True]
+
+
+async def test_retrieve_client_agnostic_listings_and_watchlist_ids(
+    authorized_client, create_listing, database
+):
+    listing = create_listing["listing"]
+    await watchlist_manager.create(
+        database, {"user_id": create_listing["user"].id, "listing_id": listing.id}
+    )
+
+    # Verify that feeds requested without watchlist flags can be shared
+    _, response = await authorized_client.get(
+        f"{BASE_URL_PATH}", params={"watchlist": "false"}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    assert all(obj["watchlist"] is None for obj in response.json["data"])
+
+    # Verify that the watched listing ids are fetched for the frontend to overlay
+    _, response = await authorized_client.get(f"{BASE_URL_PATH}/watchlist/ids")
+    assert response.status_code == 200
+    assert response.json == {
+        "status": "success",
+        "message": "Watchlist ids fetched",
+        "data": [str(listing.id)],
+    }
+
+
 async def test_retrieve_particular_listng(client, create_listing):
     listing = create_listing["listing"]
 
@@ -73,6 +220,39 @@ async def test_get_user_watchlists_listng(authorized_client, create_listing, dat
     assert any(isinstance(obj["name"], str) for obj in data)
 
 
+async def test_guest_client_is_created_lazily(client, create_listing, database):
+    listing = create_listing["listing"]
+
+    # Verify that malformed guest ids are ignored without touching the database
+    request = SimpleNamespace(headers={"guestuserid": "not-a-uuid"})
+    guest = await get_client(request, None)
+    assert guest.id is None and not guest.is_authenticated
+
+    # Verify that anonymous reads don't create guest users
+    for guestuserid in ("", str(uuid4()), "not-a-uuid"):
+        _, response = await client.get(
+            f"{BASE_URL_PATH}", headers={"guestuserid": guestuserid}
+        )
+        assert response.status_code == 200
+    assert await guestuser_manager.get_all(database) == []
+
+    # Verify that the guest user is created once its watchlist needs it
+    _, response = await client.post(
+        f"{BASE_URL_PATH}/watchlist",
+        json={"slug": listing.slug},
+        headers={"guestuserid": "not-a-uuid"},
+    )
+    assert response.status_code == 201
+    guestuser_id = response.json["data"]["guestuser_id"]
+    guestusers = await guestuser_manager.get_all(database)
+    assert [str(guestuser.id) for guestuser in guestusers] == [guestuser_id]
+
+    _, response = await client.get(
+        f"{BASE_URL_PATH}/watchlist/ids", headers={"guestuserid": guestuser_id}
+    )
+    assert response.json["data"] == [str(listing.id)]
+
+
 async def test_create_or_remove_user_watchlists_listng(
     authorized_client, create_listing
 ):
@@ -163,6 +343,46 @@ async def test_retrieve_listing_bids(
     assert isinstance(data["listing"], str)
 
 
+async def test_conditional_get_listing_bids(
+    client, create_listing, another_verified_user, database
+):
+    listing = create_listing["listing"]
+    url = f"{BASE_URL_PATH}/detail/{listing.slug}/bids"
+
+    _, response = await client.get(url)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "public, no-cache"
+    etag = response.headers["ETag"]
+
+    # Verify that an unchanged poll gets an empty 304
+    _, response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.body == b""
+
+    # Verify that a new bid changes the version
+    await bid_manager.place_bid(database, listing.slug, another_verified_user, 2000)
+    _, response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json["data"]["bids"]) == 1
+
+    # Verify that a bidder's new name changes it as well
+    etag = response.headers["ETag"]
+    await user_manager.update(database, another_verified_user, {"first_name": "New"})
+    _, response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json["data"]["bids"][0]["user"]["name"].startswith("New ")
+
+    # Verify that cached listing details are tagged too
+    url = f"{BASE_URL_PATH}/detail/{listing.slug}"
+    _, response = await client.get(url)
+    _, response = await client.get(
+        url, headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+
 async def test_create_bid(
     authorized_client, create_listing, another_verified_user, database
 ):
@@ -225,3 +445,299 @@ async def test_create_bid(
     }
 
     # You can also test for other error responses.....
+
+
+async def test_place_bid(
+    create_listing, verified_user, another_verified_user, database
+):
+    listing = create_listing["listing"]
+    slug = listing.slug
+
+    # Verify that rejected bids report why
+    outcome, bid, _ = await bid_manager.place_bid(
+        database, "invalid", verified_user, 2000
+    )
+    assert outcome == BidOutcome.NOT_FOUND and bid is None
+    outcome, *_ = await bid_manager.place_bid(database, slug, verified_user, 2000)
+    assert outcome == BidOutcome.OWN_LISTING
+    outcome, *_ = await bid_manager.place_bid(database, slug, another_verified_user, 10)
+    assert outcome == BidOutcome.BELOW_PRICE
+
+    # Verify that a bid is placed and that raising it doesn't count a new bidder
+    outcome, bid, bids_count = await bid_manager.place_bid(
+        database, slug, another_verified_user, 2000
+    )
+    assert outcome == BidOutcome.PLACED
+    assert bids_count == 1
+    outcome, *_ = await bid_manager.place_bid(
+        database, slug, another_verified_user, 2000
+    )
+    assert outcome == BidOutcome.TOO_LOW
+    outcome, raised_bid, bids_count = await bid_manager.place_bid(
+        database, slug, another_verified_user, 3000
+    )
+    assert outcome == BidOutcome.PLACED
+    assert raised_bid.id == bid.id and raised_bid.amount == 3000
+    assert bids_count == 1
+
+    listing = await database.get(type(listing), listing.pkid, populate_existing=True)
+    assert listing.highest_bid == 3000
+    assert listing.bids_count == 1
+
+
+async def test_bid_feed_hub():
+    hub = PubSubHub(queue_size=2)
+    subscription = hub.subscribe("listing-slug")
+    slow_subscription = hub.subscribe("listing-slug")
+
+    # Verify that messages are fanned out to every subscriber of the topic
+    assert hub.publish("listing-slug", "bid-1") == 2
+    assert hub.publish("another-slug", "bid-1") == 0
+    assert await subscription.get() == "bid-1"
+
+    # Verify that a subscriber that falls behind is evicted
+    hub.publish("listing-slug", "bid-2")
+    hub.publish("listing-slug", "bid-3")
+    assert slow_subscription.evicted
+    assert await slow_subscription.get() is None
+    assert await subscription.get() == "bid-2"
+    assert hub.metrics()["subscribers"] == 1
+
+
+async def test_cached_feed_countdowns_are_refreshed():
+    cache = ResponseCache(MemoryBackend(), ttl=3600)
+    closing_date = datetime.utcnow().replace(microsecond=0) + timedelta(seconds=60)
+    opened_at = closing_date.replace(tzinfo=UTC).timestamp() - 60
+    listing = SimpleNamespace(
+        closing_date=closing_date,
+        time_left_seconds=60,
+        active=True,
+    )
+
+    @cache.cached(LISTINGS, countdowns=feed_listings)
+    async def get(view, request, db, **kwargs):
+        data = [
+            {
+                "closing_date": format_datetime(listing.closing_date),
+                "time_left_seconds": time_left_seconds(listing),
+                "active": is_active(listing),
+            }
+        ]
+        return CustomResponse.success(message="Listings fetched", data=data)
+
+    def request(etag=None):
+        headers = {"If-None-Match": etag} if etag else {}
+        return SimpleNamespace(
+            method="GET", path=BASE_URL_PATH, query_args=[], headers=headers
+        )
+
+    with mock.patch("app.api.utils.response_cache.time") as clock:
+        clock.time.return_value = opened_at
+        first = await get(None, request(), db=None)
+        assert first.headers["X-Cache"] == "MISS"
+        etag = first.headers["ETag"]
+
+        # Verify that the ETag holds while the clock moves on
+        clock.time.return_value = opened_at + 10
+        second = await get(None, request(etag), db=None)
+        assert second.status == 304 and second.headers["ETag"] == etag
+
+        # Verify that a hit still counts down from when it is served
+        third = await get(None, request(), db=None)
+        assert third.headers["X-Cache"] == "HIT" and third.headers["ETag"] == etag
+        assert orjson.loads(third.body)["data"][0]["time_left_seconds"] == 50
+
+        # Verify that the ETag changes once the listing closes
+        clock.time.return_value = opened_at + 61
+        fourth = await get(None, request(etag), db=None)
+        assert fourth.status == 200 and fourth.headers["ETag"] != etag
+        assert orjson.loads(fourth.body)["data"] == [
+            {
+                "closing_date": format_datetime(closing_date),
+                "time_left_seconds": -1,
+                "active": False,
+            }
+        ]
+
+
+async def test_listing_detail_orders_related_listings_and_bids(
+    create_listing, database
+):
+    listing, user = create_listing["listing"], create_listing["user"]
+    now = datetime.utcnow()
+    related_ids, bid_ids = [], []
+    for i in range(3):
+        related = await listing_manager.create(
+            database,
+            {
+                "auctioneer_id": user.id,
+                "name": f"Related Listing {i}",
+                "desc": "Related description",
+                "category_id": listing.category_id,
+                "price": 1000.00,
+                "closing_date": now + timedelta(days=1),
+                "created_at": now - timedelta(minutes=i),
+            },
+        )
+        bid = await bid_manager.create(
+            database,
+            {
+                "user_id": user.id,
+                "listing_id": listing.id,
+                "amount": 2000 + i,
+                "updated_at": now - timedelta(minutes=i),
+            },
+        )
+        related_ids.append(related.id)
+        bid_ids.append(bid.id)
+
+    # Verify that both come back latest first, like their LATERAL subqueries pick them
+    _, related_listings, bids = await listing_manager.get_detail_by_slug(
+        database, listing.slug, related_limit=3, bids_limit=3
+    )
+    assert [related.id for related in related_listings] == related_ids
+    assert [bid.id for bid in bids] == bid_ids
+
+
+async def test_reprs_skip_unloaded_relationships(create_listing, database):
+    listing, user = create_listing["listing"], create_listing["user"]
+    bid = await bid_manager.create(
+        database, {"user_id": user.id, "listing_id": listing.id, "amount": 2000}
+    )
+    watchlist = await watchlist_manager.create(
+        database, {"user_id": user.id, "listing_id": listing.id}
+    )
+    otp = await otp_manager.create(database, {"user_id": user.id})
+
+    # Verify that none of them touches a lazy="raise" relationship
+    assert repr(bid) == f"Listing - {listing.id} | ${bid.amount}"
+    assert repr(watchlist) == f"Listing - {listing.id} | {user.id}"
+    assert repr(otp) == f"User - {user.id} | Code - {otp.code}"
+
+
+async def test_auction_scheduler_takes_aware_and_naive_deadlines():
+    scheduler = AuctionScheduler(horizon_seconds=3600)
+    app = SimpleNamespace(ctx=SimpleNamespace(SessionLocal=mock.MagicMock()))
+    offset = timezone(timedelta(hours=1))
+
+    with mock.patch("app.api.utils.auctions.listing_manager") as manager:
+        manager.close_due = mock.AsyncMock(return_value=[])
+        manager.get_closing_dates = mock.AsyncMock(return_value=[])
+        scheduler.start(app)
+        while not scheduler.metrics()["ticks"]:
+            await asyncio.sleep(0)
+
+        # Verify that an offset-bearing deadline is queued next to naive ones
+        now = datetime.utcnow()
+        scheduler.schedule((now + timedelta(minutes=30)).replace(tzinfo=UTC))
+        scheduler.schedule(now + timedelta(minutes=10))
+        assert scheduler.metrics()["pending"] == 2
+        assert 590 < scheduler.seconds_to_next() <= 600
+
+        # Verify that a due one, in any offset, wakes the scheduler to close it
+        scheduler.schedule(datetime.now(offset) - timedelta(seconds=1))
+        while manager.close_due.await_count < 2:
+            await asyncio.sleep(0)
+        await scheduler.stop()
+    assert scheduler.metrics() == {"pending": 2, "ticks": 2, "closed": 0}
+
+
+async def test_close_due_listings(create_listing, database):
+    listing = create_listing["listing"]
+
+    # Verify that listings are only closed once their closing date has passed
+    assert await listing_manager.close_due(database, datetime.utcnow()) == []
+    await listing_manager.update(
+        database, listing, {"closing_date": datetime.utcnow() - timedelta(minutes=1)}
+    )
+    closed = await listing_manager.close_due(database, datetime.utcnow())
+    assert [slug for _, slug in closed] == [listing.slug]
+
+    listing = await database.get(type(listing), listing.pkid, populate_existing=True)
+    assert listing.active is False
+    assert await listing_manager.get_closing_dates(database, datetime.utcnow()) == []
+
+
+async def test_listing_serializer_matches_schema(create_listing, database):
+    slug = create_listing["listing"].slug
+    listing = await listing_manager.get_by_slug(database, slug, *listing_card())
+
+    # Verify that the fast serializer returns what the documented schema describes
+    expected = ListingDataSchema.from_orm(listing).dict()
+    data = listing_serializer.one(listing)
+    assert data.keys() == expected.keys()
+    for key in ("price", "highest_bid"):
+        assert data.pop(key) == float(expected.pop(key))
+    assert abs(data.pop("time_left_seconds") - expected.pop("time_left_seconds")) <= 1
+    assert data == expected
+
+
+async def create_feed_listings(listing, database, count=999):
+    await database.execute(
+        insert(Listing),
+        [
+            {
+                "auctioneer_id": listing.auctioneer_id,
+                "name": f"Feed Listing {i}",
+                "slug": f"feed-listing-{i}",
+                "desc": "Feed description",
+                "category_id": listing.category_id,
+                "price": 1000.00,
+                "closing_date": listing.closing_date,
+                "image_id": None,
+            }
+            for i in range(count)
+        ],
+    )
+    await database.commit()
+
+
+async def read_orm_listings(database):
+    database.expunge_all()  # Every feed request starts with an empty session
+    return listing_serializer.many(await listing_manager.get_all(database))
+
+
+async def read_listing_cards(database):
+    return listing_card_serializer.many(await listing_reader.get_all(database))
+
+
+async def test_listing_cards_match_orm_listings(create_listing, database):
+    await create_feed_listings(create_listing["listing"], database)
+
+    # Verify that a 1k-row feed reads the same either way
+    expected = await read_orm_listings(database)
+    data = await read_listing_cards(database)
+    assert len(data) == 1000
+    for item, expected_item in zip(data, expected):
+        left = item.pop("time_left_seconds") - expected_item.pop("time_left_seconds")
+        assert abs(left) <= 1
+        assert item == expected_item
+
+    # Verify that cards are slotted records, without a __dict__ per row
+    card = (await listing_reader.get_all(database, limit=1))[0]
+    assert isinstance(card, ListingCard)
+    assert not hasattr(card, "__dict__")
+
+
+async def measure(read, runs=5):
+    # Best latency and peak allocated bytes over a few runs
+    timings, peaks = [], []
+    for _ in range(runs):
+        tracemalloc.start()
+        started = time.perf_counter()
+        await read()
+        timings.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(timings), min(peaks)
+
+
+@pytest.mark.benchmark
+async def test_listing_cards_outrun_orm_listings(create_listing, database):
+    await create_feed_listings(create_listing["listing"], database)
+
+    # Verify that read models take less time and memory than ORM instances
+    orm_seconds, orm_bytes = await measure(lambda: read_orm_listings(database))
+    card_seconds, card_bytes = await measure(lambda: read_listing_cards(database))
+    assert card_seconds < orm_seconds
+    assert card_bytes < orm_bytes
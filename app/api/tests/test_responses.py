@@ -0,0 +1,115 @@
+from app.common.middlewares import close_db_session
+from app.common.responses import CustomResponse
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from decimal import Decimal
+from uuid import UUID, uuid4
+import copy, mock, pytest, time, ujson
+
+
+def listings_payload(count=500):
+    now = datetime.utcnow()
+    return [
+        {
+            "id": uuid4(),
+            "name": f"Listing {i}",
+            "auctioneer": {"id": str(uuid4()), "name": "John Doe", "avatar": None},
+            "slug": f"listing-{i}",
+            "desc": "Description",
+            "category": "Other",
+            "price": Decimal("1000.00"),
+            "closing_date": now + timedelta(days=1),
+            "time_left_seconds": 86400,
+            "active": True,
+            "bids_count": i,
+            "highest_bid": Decimal("1500.50"),
+            "image": None,
+            "watchlist": False,
+        }
+        for i in range(count)
+    ]
+
+
+def convert_then_dump(data):
+    # What CustomResponse used to do: stringify values, then encode again
+    for obj in data:
+        for key, value in obj.items():
+            if isinstance(value, datetime):
+                obj[key] = str(value.isoformat())
+            elif isinstance(value, UUID):
+                obj[key] = str(value)
+    return ujson.dumps(
+        {"status": "success", "message": "Listings fetched", "data": data}
+    )
+
+
+def best_of(func, payloads):
+    timings = []
+    for payload in payloads:
+        started = time.perf_counter()
+        func(payload)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def test_success_response_encodes_nested_values():
+    listing_id, created_at = uuid4(), datetime(2023, 5, 1, 12, 30)
+    response = CustomResponse.success(
+        message="Listing details fetched",
+        data={"listing": {"id": listing_id, "created_at": created_at}},
+        next_cursor=None,
+    )
+    assert ujson.loads(response.body) == {
+        "status": "success",
+        "message": "Listing details fetched",
+        "data": {
+            "listing": {"id": str(listing_id), "created_at": "2023-05-01T12:30:00"}
+        },
+        "next_cursor": None,
+    }
+
+
+def test_success_response_encodes_listings_as_before():
+    payload = listings_payload()
+
+    # Verify that the output is unchanged for the flat data the old walk handled
+    expected = convert_then_dump(copy.deepcopy(payload))
+    response = CustomResponse.success(message="Listings fetched", data=payload)
+    assert ujson.loads(response.body) == ujson.loads(expected)
+
+
+@pytest.mark.benchmark
+def test_success_response_encodes_listings_faster():
+    payloads = [listings_payload() for _ in range(10)]
+
+    # Verify that encoding in a single pass beats converting and then encoding
+    old = best_of(convert_then_dump, copy.deepcopy(payloads))
+    new = best_of(
+        lambda data: CustomResponse.success(message="Listings fetched", data=data),
+        payloads,
+    )
+    assert new < old
+
+
+async def test_failed_commit_replaces_success_response():
+    db = mock.AsyncMock(info={})
+    db.commit.side_effect = Exception("could not serialize access")
+    request = SimpleNamespace(ctx=SimpleNamespace(db=db), headers={})
+
+    # Verify that the client gets a 500 instead of the success it was about to get
+    response = await close_db_session(request, CustomResponse.success("Saved"))
+    assert response.status == 500
+    assert ujson.loads(response.body) == {
+        "status": "failure",
+        "message": "Server Error",
+    }
+    assert "Access-Control-Allow-Origin" in response.headers
+    db.rollback.assert_awaited_once()
+    db.close.assert_awaited_once()
+    assert request.ctx.db is None
+
+    # A committed unit of work leaves the response alone
+    db = mock.AsyncMock(info={})
+    request = SimpleNamespace(ctx=SimpleNamespace(db=db), headers={})
+    assert await close_db_session(request, CustomResponse.success("Saved")) is None
+    db.commit.assert_awaited_once()
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+import asyncio, heapq
+
+from app.common.dates import to_naive_utc
+from app.core.config import settings
+from app.db.managers.listings import listing_manager
+
+
+class AuctionScheduler:
+    """
+    Closes listings when their closing_date passes.
+    Deadlines within the next `horizon_seconds` are kept in a min-heap, so the
+    task sleeps until the earliest one and closes everything due in one UPDATE.
+    **Parameters**
+    * `horizon_seconds`: How far ahead deadlines are loaded from the database
+    * `retry_seconds`: Delay before trying again after a database error
+    """
+
+    def __init__(self, horizon_seconds: int = 600, retry_seconds: int = 5):
+        self.horizon_seconds = horizon_seconds
+        self.retry_seconds = retry_seconds
+        self._deadlines = []
+        self._loaded_until = None
+        self._task = None
+        self._wakeup = None
+
+        # Metrics
+        self.ticks = 0
+        self.closed = 0
+
+    def start(self, app):
+        if self._task:
+            return
+        self._deadlines = []
+        self._loaded_until = None
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(app))
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def schedule(self, closing_date: datetime):
+        # Deadlines past the loaded horizon are picked up by the next reload
+        if not self._task or not closing_date:
+            return
+        closing_date = to_naive_utc(closing_date)
+        if self._loaded_until and closing_date > self._loaded_until:
+            return
+        heapq.heappush(self._deadlines, closing_date)
+        self._wakeup.set()
+
+    def reload(self):
+        self._loaded_until = None
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self, app):
+        while True:
+            try:
+                await self.tick(app.ctx.SessionLocal)
+                timeout = self.seconds_to_next()
+            except Exception as e:
+                print(f"Auction Error - {e}")
+                self._loaded_until = None
+                timeout = self.retry_seconds
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def tick(self, SessionLocal):
+        now = datetime.utcnow()
+        due = False
+        while self._deadlines and self._deadlines[0] <= now:
+            heapq.heappop(self._deadlines)
+            due = True
+
+        async with SessionLocal() as db:
+            if due or not self._loaded_until:
+                # Also closes whatever fell due while no worker was running
+                self.closed += len(await listing_manager.close_due(db, now))
+                self.ticks += 1
+            if not self._loaded_until or now >= self._loaded_until:
+                until = now + timedelta(seconds=self.horizon_seconds)
+                deadlines = await listing_manager.get_closing_dates(db, until)
+                self._deadlines = [d for d in deadlines if d > now]
+                heapq.heapify(self._deadlines)
+                self._loaded_until = until
+
+    def seconds_to_next(self) -> float:
+        now = datetime.utcnow()
+        wake_at = self._loaded_until
+        if self._deadlines:
+            wake_at = min(wake_at, self._deadlines[0])
+        return max((wake_at - now).total_seconds(), 0)
+
+    def metrics(self) -> dict:
+        return {
+            "pending": len(self._deadlines),
+            "ticks": self.ticks,
+            "closed": self.closed,
+        }
+
+
+auction_scheduler = AuctionScheduler(
+    horizon_seconds=settings.AUCTION_HORIZON_SECONDS,
+    retry_seconds=settings.AUCTION_RETRY_SECONDS,
+)
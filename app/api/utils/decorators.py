@@ -22,3 +22,22 @@ def validate_request(schema):
         return decorated_function
 
     return decorator
+
+
+def cache_control(value):
+    # value is the Cache-Control header, or a function of the request returning it
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            response = await f(*args, **kwargs)
+            request = args[0]
+            if not isinstance(request, Request):  # Important for CBVs
+                request = args[1]
+            if response.status in (200, 304):
+                header = value(request) if callable(value) else value
+                response.headers["Cache-Control"] = header
+            return response
+
+        return decorated_function
+
+    return decorator
@@ -1,47 +1,46 @@
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from .threads import EmailThread
+import asyncio
+
+from .mailers import email_delivery
 from app.core.config import settings
-from app.db.managers.accounts import otp_manager
+from app.db import transactions
+from app.db.managers.accounts import otp_manager, email_outbox_manager
+
+
+# Emails that carry a one-time code
+OTP_TYPES = ("activate", "reset")
 
 
-async def sort_email(db, user, type):
+def sort_email(type):
     template = "welcome.html"
     subject = "Account verified"
 
-    data = {"template": template, "subject": subject}
-
     # Sort different templates and subject for respective email types
     if type == "activate":
         template = "email-activation.html"
         subject = "Activate your account"
-        otp = (await otp_manager.create(db, {"user_id": user.id})).code
-        data = {"template": template, "subject": subject, "otp": otp}
 
     elif type == "reset":
         template = "password-reset.html"
         subject = "Reset your password"
-        otp = (await otp_manager.create(db, {"user_id": user.id})).code
-        data = {"template": template, "subject": subject, "otp": otp}
 
     elif type == "reset-success":
         template = "password-reset-success.html"
         subject = "Password reset successfully"
-        data = {"template": template, "subject": subject}
 
-    return data
+    return {"template": template, "subject": subject}
 
 
-async def send_email(request, db, user, type):
-    template_env = request.app.ctx.template_env
-    email_data = await sort_email(db, user, type)
+def build_email(template_env, email):
+    # Renders a claimed outbox row. Retries render the same email, code included.
+    email_data = sort_email(email.type)
     template = email_data["template"]
     subject = email_data["subject"]
 
-    context = {"name": user.first_name}
-    otp = email_data.get("otp")
-    if otp:
-        context["otp"] = otp
+    context = {"name": email.name}
+    if email.otp:
+        context["otp"] = email.otp
 
     # Render the email template using Sanic-Jinja2
     template = template_env.get_template(template)
@@ -50,9 +49,135 @@ async def send_email(request, db, user, type):
     # Create a message with the HTML content
     message = MIMEMultipart()
     message["From"] = settings.MAIL_SENDER_EMAIL
-    message["To"] = user.email
+    message["To"] = email.email
     message["Subject"] = subject
     message.attach(MIMEText(html, "html"))
+    return message
+
+
+async def send_email(request, db, user, type, commit=True):
+    # Only record the email, the outbox dispatcher renders and delivers it.
+    # The code is created with it, so both are committed or neither is.
+    otp = None
+    if type in OTP_TYPES:
+        otp = (await otp_manager.create(db, {"user_id": user.id}, commit=False)).code
+    await email_outbox_manager.create(
+        db,
+        {
+            "user_id": user.id,
+            "email": user.email,
+            "name": user.first_name,
+            "type": type,
+            "otp": otp,
+        },
+        commit,
+    )
+    if commit:
+        email_dispatcher.wake()
+    else:
+        # The dispatcher can't claim the row before it is committed
+        transactions.after_commit(db, email_dispatcher.wake)
+
+
+class EmailOutboxDispatcher:
+    """
+    Background task that claims due outbox rows in batches, renders them and
+    hands them to the delivery service. Safe to run on every worker.
+    **Parameters**
+    * `delivery`: The EmailDeliveryService used to send messages
+    * `batch_size`: Max number of emails claimed at once
+    * `poll_interval`: Seconds to sleep when the outbox is empty
+    """
+
+    def __init__(
+        self,
+        delivery,
+        batch_size: int = 20,
+        poll_interval: float = 2.0,
+        lease_seconds: int = 300,
+        max_attempts: int = 5,
+        retry_seconds: int = 60,
+    ):
+        self.delivery = delivery
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._task = None
+        self._wakeup = None
+
+    def start(self, app):
+        if self._task:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(app))
+
+    def wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self, app):
+        while True:
+            try:
+                count = await self.dispatch_batch(
+                    app.ctx.SessionLocal, app.ctx.template_env
+                )
+            except Exception as e:
+                print(f"Email Error - {e}")
+                count = 0
+            if count < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=self.poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def dispatch_batch(self, SessionLocal, template_env) -> int:
+        async with SessionLocal() as db:
+            emails = await email_outbox_manager.claim_batch(
+                db, self.batch_size, self.lease_seconds
+            )
+            if not emails:
+                return 0
+
+            pending = []
+            for email in emails:
+                try:
+                    message = build_email(template_env, email)
+                    pending.append((email, await self.delivery.send(message)))
+                except Exception as e:
+                    await self.fail(db, email, str(e))
+
+            sent = []
+            for email, future in pending:
+                if await future:
+                    sent.append(email)
+                else:
+                    await self.fail(db, email, "Delivery failed")
+            await email_outbox_manager.mark_sent(db, sent)
+            return len(emails)
+
+    async def fail(self, db, email, error):
+        await email_outbox_manager.mark_failed(
+            db, email, error, self.max_attempts, self.retry_seconds
+        )
+
 
-    # Send email in background
-    EmailThread(message).start()
+email_dispatcher = EmailOutboxDispatcher(
+    email_delivery,
+    batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+    poll_interval=settings.EMAIL_OUTBOX_POLL_SECONDS,
+    lease_seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS,
+    max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    retry_seconds=settings.EMAIL_OUTBOX_RETRY_SECONDS,
+)
@@ -1,3 +1,4 @@
+from app.common.caches import TTLCache
 from app.common.responses import CustomResponse
 from app.core.config import settings
 import time
@@ -7,6 +8,9 @@ import mimetypes
 
 BASE_FOLDER = "bidout-auction-v2/"
 
+# File urls are a pure function of (key, folder, content_type) and never expire
+file_url_cache = TTLCache(maxsize=settings.FILE_URL_CACHE_SIZE)
+
 # FILES CONFIG WITH CLOUDINARY
 cloudinary.config(
     cloud_name=settings.CLOUDINARY_CLOUD_NAME,
@@ -34,11 +38,18 @@ class FileProcessor:
             return CustomResponse.error("Couldn't generate signature")
 
     def generate_file_url(key, folder, content_type):
+        cache_key = (str(key), folder, content_type)
+        url = file_url_cache.get(cache_key)
+        if url:
+            return url
+
         file_extension = mimetypes.guess_extension(content_type)
         key = f"{BASE_FOLDER}{folder}/{key}{file_extension}"
 
         try:
-            return cloudinary.utils.cloudinary_url(key, secure=True)[0]
+            url = cloudinary.utils.cloudinary_url(key, secure=True)[0]
+            file_url_cache.set(cache_key, url)
+            return url
         except Exception as e:
             print(e)
             return CustomResponse.error("Couldn't generate file url!")
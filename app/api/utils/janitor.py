@@ -0,0 +1,86 @@
+from datetime import datetime
+import asyncio, time
+
+from app.core.config import settings
+from app.db.managers.accounts import jwt_manager, otp_manager
+from app.db.managers.base import guestuser_manager
+
+
+class Janitor:
+    """
+    Periodically deletes rows nothing will read again: guest users idle past
+    GUEST_USER_TTL_DAYS (with their watchlists), expired OTPs and JWTs past
+    refresh expiry. Rows are deleted in bounded batches, each in its own short
+    transaction.
+    **Parameters**
+    * `interval_seconds`: Delay between runs
+    * `batch_size`: Max rows deleted by one statement
+    """
+
+    def __init__(self, interval_seconds: int = 3600, batch_size: int = 500):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._task = None
+
+        # Metrics
+        self.runs = 0
+        self.deleted = {"guestusers": 0, "otps": 0, "jwts": 0}
+        self.last_run = None
+
+    def start(self, app):
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run(app))
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self, app):
+        while True:
+            try:
+                await self.run_once(app.ctx.SessionLocal)
+            except Exception as e:
+                print(f"Janitor Error - {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self, SessionLocal) -> dict:
+        tasks = {
+            "guestusers": guestuser_manager.delete_idle,
+            "otps": otp_manager.delete_expired,
+            "jwts": jwt_manager.delete_expired,
+        }
+        run = {"started_at": datetime.utcnow().isoformat()}
+        async with SessionLocal() as db:
+            for name, delete_batch in tasks.items():
+                started, count = time.perf_counter(), 0
+                while True:
+                    deleted = await delete_batch(db, self.batch_size)
+                    count += deleted
+                    if deleted < self.batch_size:
+                        break
+                    await asyncio.sleep(0)  # Let requests through between batches
+                self.deleted[name] += count
+                run[name] = {
+                    "deleted": count,
+                    "ms": round((time.perf_counter() - started) * 1000, 2),
+                }
+        self.runs += 1
+        self.last_run = run
+        return run
+
+    def metrics(self) -> dict:
+        return {
+            "runs": self.runs,
+            "deleted": self.deleted,
+            "last_run": self.last_run,
+        }
+
+
+janitor = Janitor(
+    interval_seconds=settings.JANITOR_INTERVAL_SECONDS,
+    batch_size=settings.JANITOR_BATCH_SIZE,
+)
@@ -0,0 +1,158 @@
+from email.message import Message
+import asyncio
+
+import aiosmtplib
+
+from app.core.config import settings
+
+
+class EmailDeliveryService:
+    """
+    Delivers emails from a bounded queue over a small pool of persistent,
+    authenticated SMTP connections (one per worker task).
+    **Parameters**
+    * `pool_size`: Number of worker tasks, each holding one SMTP connection
+    * `queue_size`: Max number of messages waiting to be sent
+    * `batch_size`: Max number of queued messages a worker sends in one go
+    * `max_retries`: Attempts after the first failure, with exponential backoff
+    * `drain_timeout`: Seconds allowed to flush the queue when stopping
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str = None,
+        password: str = None,
+        use_tls: bool = True,
+        pool_size: int = 2,
+        queue_size: int = 1000,
+        batch_size: int = 20,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        drain_timeout: float = 10.0,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.drain_timeout = drain_timeout
+
+        self._queue = None
+        self._workers = []
+        self._closing = False
+
+        # Metrics
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        if self._workers:
+            return
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.pool_size)
+        ]
+
+    async def stop(self):
+        if not self._workers:
+            return
+        self._closing = True  # No more backoff, each message gets a last attempt
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Email Error - {self._queue.qsize()} emails left undelivered")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def send(self, message: Message) -> asyncio.Future:
+        # Queue a message. The returned future resolves to whether it was sent.
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, future))
+        return future
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            use_tls=self.use_tls,
+        )
+        await smtp.connect()
+        return smtp
+
+    async def _deliver(self, smtp, message, future):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if not smtp or not smtp.is_connected:
+                    smtp = await self._connect()
+                await smtp.send_message(message)
+                self.sent += 1
+                if not future.done():
+                    future.set_result(True)
+                return smtp
+            except Exception as e:
+                print(f"Email Error - {e}")
+                if smtp:
+                    smtp.close()
+                smtp = None
+                if self._closing or attempt == self.max_retries:
+                    break
+                self.retried += 1
+                await asyncio.sleep(self.retry_backoff * 2**attempt)
+
+        self.failed += 1
+        if not future.done():
+            future.set_result(False)
+        return smtp
+
+    async def _worker(self):
+        smtp = None
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                for message, future in batch:
+                    try:
+                        smtp = await self._deliver(smtp, message, future)
+                    finally:
+                        self._queue.task_done()
+        finally:
+            if smtp and smtp.is_connected:
+                smtp.close()
+
+    def metrics(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+email_delivery = EmailDeliveryService(
+    hostname=settings.MAIL_SENDER_HOST,
+    port=settings.MAIL_SENDER_PORT,
+    username=settings.MAIL_SENDER_EMAIL,
+    password=settings.MAIL_SENDER_PASSWORD,
+    use_tls=settings.MAIL_USE_TLS,
+    pool_size=settings.MAIL_POOL_SIZE,
+    queue_size=settings.MAIL_QUEUE_SIZE,
+    batch_size=settings.MAIL_BATCH_SIZE,
+    max_retries=settings.MAIL_MAX_RETRIES,
+    drain_timeout=settings.MAIL_DRAIN_TIMEOUT,
+)
@@ -0,0 +1,57 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from uuid import UUID
+
+from sanic import Request, SanicException
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 100
+
+
+def encode_cursor(obj: Any) -> str:
+    # Opaque cursor over the (created_at, id) sort key of the last item in a page
+    raw = f"{obj.created_at.isoformat()}|{obj.id}"
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value: Optional[str]) -> Optional[Tuple[datetime, UUID]]:
+    if not value:
+        return None
+    try:
+        created_at, id = urlsafe_b64decode(value.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(id)
+    except:
+        raise SanicException(message="Invalid cursor", status_code=400)
+
+
+def validate_limit(value, field="Limit") -> Optional[int]:
+    if value in (None, ""):
+        return None
+    try:
+        value = int(value)
+    except:
+        raise SanicException(message=f"{field} must be an integer", status_code=400)
+    if value < 1:
+        raise SanicException(message=f"{field} must be greater than 0", status_code=400)
+    return min(value, MAX_PAGE_LIMIT)
+
+
+def get_pagination_params(request: Request) -> Tuple[Optional[tuple], int]:
+    # "quantity" is still accepted for older clients. They sent 0 for "no limit",
+    # which now means the default page size, like leaving it out.
+    limit = validate_limit(request.args.get("limit"))
+    if not limit:
+        quantity = request.args.get("quantity")
+        if quantity != "0":
+            limit = validate_limit(quantity, field="Quantity")
+    cursor = decode_cursor(request.args.get("cursor"))
+    return cursor, limit or DEFAULT_PAGE_LIMIT
+
+
+def paginate(items: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    # Expects up to limit + 1 items; the extra one only signals a next page
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(items[-1])
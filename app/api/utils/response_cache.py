@@ -0,0 +1,270 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from sanic.response import HTTPResponse
+
+from app.api.utils.serializers import freeze_countdown, refresh_countdown
+from app.common.caches import MemoryBackend, RedisBackend
+from app.common.dates import to_naive_utc
+from app.common.responses import CustomResponse
+from app.core.config import settings
+import asyncio, orjson, time
+
+# Tags a cached response can depend on
+LISTINGS = "listings"
+CATEGORIES = "categories"
+SITEDETAILS = "sitedetails"
+REVIEWS = "reviews"
+ALL_TAGS = (LISTINGS, CATEGORIES, SITEDETAILS, REVIEWS)
+
+
+class ResponseCache:
+    """
+    Caches the encoded bodies of public GET responses and their ETags, keyed by
+    path and query.
+    Entries are fresh for `ttl` seconds, then served for `stale_ttl` more seconds
+    while a single background render replaces them (stale-while-revalidate).
+    Writes drop the entries tagged with what they changed. Listing countdowns,
+    which change with time alone, are recounted when served.
+    **Parameters**
+    * `backend`: Where bodies are stored, a MemoryBackend or a RedisBackend
+    * `ttl`: Seconds an entry is served without being re-rendered
+    * `stale_ttl`: Seconds an expired entry can still be served while it is re-rendered
+    """
+
+    def __init__(self, backend, ttl: float = 30, stale_ttl: float = 300):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # Bumped by every invalidation, so a render started before one isn't stored
+        self._versions = defaultdict(int)
+        self._refreshing = set()
+        self._tasks = set()
+
+        # Metrics
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.stored = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def cached(
+        self,
+        *tags: str,
+        shared: Optional[Callable] = None,
+        countdowns: Optional[Callable] = None,
+    ):
+        """
+        Caches the successful responses of a class based view's GET handler.
+        **Parameters**
+        * `tags`: What the response depends on, any of ALL_TAGS
+        * `shared`: Tells if a request gets the same response as every other
+          client, for views that can personalize it. Always, when not given.
+        * `countdowns`: Returns the serialized listings in a decoded payload.
+          Their countdowns are recounted when served and left out of the ETag.
+        """
+
+        def decorator(f):
+            @wraps(f)
+            async def decorated_function(view, request, *args, **kwargs):
+                if not self.is_cacheable(request, shared):
+                    response = await f(view, request, *args, **kwargs)
+                    if countdowns and response.status == 200:
+                        etag, deadlines = self.version(response.body, countdowns)
+                        response.headers["ETag"] = self.countdown_etag(
+                            etag, deadlines, time.time()
+                        )
+                    return response
+
+                key = self.make_key(request)
+                entry = await self.read(key)
+                if entry:
+                    now = time.time()
+                    fresh_until, etag, deadlines, body = entry
+                    etag = self.countdown_etag(etag, deadlines, now)
+                    if fresh_until > now:
+                        self.hits += 1
+                        state = "HIT"
+                    else:
+                        self.stale += 1
+                        state = "STALE"
+                        self.revalidate(
+                            key, tags, f, view, request, args, kwargs, countdowns
+                        )
+                    if CustomResponse.etag_matches(request, etag):
+                        response = CustomResponse.not_modified(etag)
+                        response.headers["X-Cache"] = state
+                        return response
+                    if countdowns:
+                        body = self.recount(body, countdowns, now)
+                    return self.respond(body, etag, state)
+
+                self.misses += 1
+                response = await self.render(
+                    key, tags, f, view, request, args, kwargs, countdowns
+                )
+                response.headers["X-Cache"] = "MISS"
+                return response
+
+            return decorated_function
+
+        return decorator
+
+    @staticmethod
+    def is_cacheable(request, shared: Optional[Callable]) -> bool:
+        if request.method != "GET":
+            return False
+        return shared is None or shared(request)
+
+    @staticmethod
+    def make_key(request) -> str:
+        return f"{request.path}?{urlencode(sorted(request.query_args))}"
+
+    @staticmethod
+    def respond(body: bytes, etag: str, state: str) -> HTTPResponse:
+        return HTTPResponse(
+            body,
+            content_type="application/json",
+            headers={"ETag": etag, "X-Cache": state},
+        )
+
+    @staticmethod
+    def version(body: bytes, countdowns: Callable) -> Tuple[str, List[float]]:
+        # An ETag of the body without its countdowns, and the times its listings
+        # close, when the active flags the body shows change
+        payload = orjson.loads(body)
+        deadlines = [freeze_countdown(listing) for listing in countdowns(payload)]
+        etag = CustomResponse.make_etag(CustomResponse.dumps(payload))
+        return etag, sorted(deadline for deadline in deadlines if deadline)
+
+    @staticmethod
+    def countdown_etag(etag: str, deadlines: List[float], now: float) -> str:
+        # Changes with the number of listings closed since, not with the clock
+        closed = bisect_left(deadlines, now)
+        return CustomResponse.make_etag(etag, closed) if closed else etag
+
+    @staticmethod
+    def recount(body: bytes, countdowns: Callable, now: float) -> bytes:
+        payload = orjson.loads(body)
+        now = to_naive_utc(datetime.fromtimestamp(now, timezone.utc))
+        for listing in countdowns(payload):
+            refresh_countdown(listing, now)
+        return CustomResponse.dumps(payload)
+
+    async def read(self, key: str) -> Optional[Tuple[float, str, List[float], bytes]]:
+        try:
+            payload = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            print(f"Cache Error - {e}")
+            return None
+        if not payload:
+            return None
+        header, _, body = payload.partition(b"\n")
+        fresh_until, etag, deadlines = header.decode().split(" ")
+        deadlines = [float(deadline) for deadline in deadlines.split(",") if deadline]
+        return float(fresh_until), etag, deadlines, body
+
+    async def render(
+        self, key, tags, f, view, request, args, kwargs, countdowns=None
+    ) -> HTTPResponse:
+        versions = [self._versions[tag] for tag in tags]
+        response = await f(view, request, *args, **kwargs)
+        if response.status != 200:
+            return response
+
+        # Hashed once here, so hits carry their ETag without hashing the body again
+        deadlines = []
+        if countdowns:
+            etag, deadlines = self.version(response.body, countdowns)
+            response.headers["ETag"] = self.countdown_etag(etag, deadlines, time.time())
+        else:
+            etag = response.headers.get("ETag")
+            etag = response.headers["ETag"] = etag or CustomResponse.make_etag(
+                response.body
+            )
+        if versions != [self._versions[tag] for tag in tags]:
+            return response  # Invalidated while rendering, may already be outdated
+
+        payload = b"%.3f %b %b\n%b" % (
+            time.time() + self.ttl,
+            etag.encode(),
+            ",".join("%.3f" % deadline for deadline in deadlines).encode(),
+            response.body,
+        )
+        try:
+            await self.backend.set(key, payload, self.ttl + self.stale_ttl, tags)
+            self.stored += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"Cache Error - {e}")
+        return response
+
+    def revalidate(self, key, tags, f, view, request, args, kwargs, countdowns):
+        if key in self._refreshing:
+            return  # Another request is already re-rendering it
+        self._refreshing.add(key)
+
+        async def refresh():
+            # The request's session is closed once the stale response is sent
+            db = request.app.ctx.SessionLocal()
+            try:
+                await self.render(
+                    key, tags, f, view, request, args, {**kwargs, "db": db}, countdowns
+                )
+            except Exception as e:
+                self.errors += 1
+                print(f"Cache Error - {e}")
+            finally:
+                await db.close()
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def invalidate(self, *tags: str):
+        for tag in tags:
+            self._versions[tag] += 1
+        self.invalidations += 1
+        try:
+            await self.backend.invalidate(*tags)
+        except Exception as e:
+            self.errors += 1
+            print(f"Cache Error - {e}")
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.backend.close()
+
+    def metrics(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale": self.stale,
+            "misses": self.misses,
+            "stored": self.stored,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "refreshing": len(self._refreshing),
+            "backend": self.backend.metrics(),
+        }
+
+
+def get_backend(url: Optional[str]):
+    if url:
+        return RedisBackend(url)
+    return MemoryBackend(maxsize=settings.RESPONSE_CACHE_MAX_SIZE)
+
+
+response_cache = ResponseCache(
+    get_backend(settings.RESPONSE_CACHE_URL),
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    stale_ttl=settings.RESPONSE_CACHE_STALE_SECONDS,
+)
@@ -0,0 +1,261 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from functools import partial
+from operator import attrgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Union,
+    get_args,
+    get_type_hints,
+)
+from uuid import UUID
+
+from sqlalchemy import inspect
+from sqlalchemy.types import DateTime, Numeric, Uuid
+
+from app.api.utils.file_processors import FileProcessor
+from app.db.models.listings import Bid, Listing
+from app.db.readmodels import ListingCard
+
+# A field is either a column name or a function of the object being serialized
+FieldSpec = Union[str, Callable[[Any], Any]]
+
+
+def format_uuid(value: Optional[UUID]) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def format_datetime(value: Optional[datetime]) -> Optional[str]:
+    # Same output as strftime("%Y-%m-%dT%H:%M:%S.%fZ"), without parsing a format
+    if value is None:
+        return None
+    if value.microsecond:
+        return f"{value.isoformat()}Z"
+    return f"{value.isoformat()}.000000Z"
+
+
+def format_decimal(value: Optional[Decimal]) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def convert(get: Callable, converter: Callable, obj: Any) -> Any:
+    return converter(get(obj))
+
+
+# Converters of read model fields, picked by their annotated type
+TYPE_CONVERTERS = {
+    UUID: format_uuid,
+    datetime: format_datetime,
+    Decimal: format_decimal,
+}
+
+
+class Serializer:
+    """
+    Turns ORM objects into JSON-ready dicts without per-row pydantic validation.
+    Column fields get a converter picked from their column type. Getters are
+    built once, when the serializer is made.
+    **Parameters**
+    * `model`: The SQLAlchemy model class or the slotted read model being serialized
+    * `fields`: Output key mapped to a column name or to a function of the object
+    """
+
+    def __init__(self, model, **fields: FieldSpec):
+        self.model = model
+        self.fields = fields
+        self.mapper = inspect(model, raiseerr=False)
+        self.serialize = self.compile()
+
+    def get_converter(self, name: str) -> Optional[Callable]:
+        if self.mapper is None:
+            hint = get_type_hints(self.model).get(name)
+            for type_ in get_args(hint) or (hint,):  # Optional[X] is Union[X, None]
+                if type_ in TYPE_CONVERTERS:
+                    return TYPE_CONVERTERS[type_]
+            return None
+        column = self.mapper.columns.get(name)
+        if column is None:
+            return None  # A plain attribute or property, returned as is
+        if isinstance(column.type, Uuid):
+            return format_uuid
+        if isinstance(column.type, DateTime):
+            return format_datetime
+        if isinstance(column.type, Numeric):
+            return format_decimal
+        return None
+
+    def compile(self) -> Callable[[Any], Dict[str, Any]]:
+        # One getter per output key, so serializing a row is a single dict build
+        getters = []
+        for key, field in self.fields.items():
+            if callable(field):
+                getters.append((key, field))
+                continue
+            get, converter = attrgetter(field), self.get_converter(field)
+            if converter:
+                getters.append((key, partial(convert, get, converter)))
+            else:
+                getters.append((key, get))
+
+        def serialize(obj):
+            return {key: get(obj) for key, get in getters}
+
+        return serialize
+
+    def one(self, obj: Any) -> Dict[str, Any]:
+        return self.serialize(obj)
+
+    def many(self, objs: Iterable[Any]) -> List[Dict[str, Any]]:
+        serialize = self.serialize
+        return [serialize(obj) for obj in objs]
+
+
+# FIELD HELPERS
+def avatar_url(user) -> Optional[str]:
+    if not user.avatar_id:
+        return None
+    return FileProcessor.generate_file_url(
+        key=user.avatar_id, folder="avatars", content_type=user.avatar.resource_type
+    )
+
+
+def show_user(user) -> Dict[str, Any]:
+    return {"name": user.full_name, "avatar": avatar_url(user)}
+
+
+def show_auctioneer(listing) -> Dict[str, Any]:
+    auctioneer = listing.auctioneer
+    return {
+        "id": str(auctioneer.id),
+        "name": auctioneer.full_name,
+        "avatar": avatar_url(auctioneer),
+    }
+
+
+def show_category(listing) -> str:
+    category = listing.category
+    return category.name if category else "Other"
+
+
+def show_image(listing) -> Optional[str]:
+    image = listing.image
+    if not image:
+        return None
+    return FileProcessor.generate_file_url(
+        key=image.id, folder="listings", content_type=image.resource_type
+    )
+
+
+def time_left_seconds(listing) -> int:
+    return int(listing.time_left_seconds)
+
+
+def is_active(listing) -> bool:
+    return bool(listing.active) and int(listing.time_left_seconds) > 0
+
+
+def parse_closing_date(listing: Dict[str, Any]) -> datetime:
+    return datetime.fromisoformat(listing["closing_date"].rstrip("Z"))
+
+
+def refresh_countdown(listing: Dict[str, Any], now: datetime):
+    # Brings a listing serialized earlier, e.g. a cached one, up to `now`
+    listing["time_left_seconds"] = int(
+        (parse_closing_date(listing) - now).total_seconds()
+    )
+    listing["active"] = listing["active"] and listing["time_left_seconds"] > 0
+
+
+def freeze_countdown(listing: Dict[str, Any]) -> Optional[float]:
+    # Leaves time out of a serialized listing, e.g. to version it. Returns the
+    # timestamp after which is_active turns False, as time_left_seconds drops below 1.
+    listing["time_left_seconds"] = None
+    if not listing["active"]:
+        return None
+    closing_date = parse_closing_date(listing).replace(tzinfo=timezone.utc)
+    return closing_date.timestamp() - 1
+
+
+# Output matches ListingDataSchema, which stays for the OpenAPI docs
+listing_serializer = Serializer(
+    Listing,
+    name="name",
+    auctioneer=show_auctioneer,
+    slug="slug",
+    desc="desc",
+    category=show_category,
+    price="price",
+    closing_date="closing_date",
+    time_left_seconds=time_left_seconds,
+    active=is_active,
+    bids_count="bids_count",
+    highest_bid="highest_bid",
+    image=show_image,
+    watchlist=lambda listing: None,
+)
+
+# Output matches BidDataSchema
+bid_serializer = Serializer(
+    Bid,
+    id="id",
+    user=lambda bid: show_user(bid.user),
+    amount="amount",
+    created_at="created_at",
+    updated_at="updated_at",
+)
+
+
+# Output matches listing_serializer, for feeds read as ListingCards
+def show_card_auctioneer(card) -> Dict[str, Any]:
+    avatar = None
+    if card.auctioneer_avatar_id:
+        avatar = FileProcessor.generate_file_url(
+            key=card.auctioneer_avatar_id,
+            folder="avatars",
+            content_type=card.auctioneer_avatar_type,
+        )
+    return {
+        "id": str(card.auctioneer_id),
+        "name": f"{card.auctioneer_first_name} {card.auctioneer_last_name}",
+        "avatar": avatar,
+    }
+
+
+def show_card_image(card) -> Optional[str]:
+    if not card.image_id:
+        return None
+    return FileProcessor.generate_file_url(
+        key=card.image_id, folder="listings", content_type=card.image_type
+    )
+
+
+listing_card_serializer = Serializer(
+    ListingCard,
+    name="name",
+    auctioneer=show_card_auctioneer,
+    slug="slug",
+    desc="desc",
+    category=lambda card: card.category_name or "Other",
+    price="price",
+    closing_date="closing_date",
+    time_left_seconds=time_left_seconds,
+    active=is_active,
+    bids_count="bids_count",
+    highest_bid="highest_bid",
+    image=show_card_image,
+    watchlist=lambda card: None,
+)
+
+
+def serialize_listings(listings: List[ListingCard], watchlist_ids=None) -> List[dict]:
+    # watchlist_ids: ids of the listings the client watches, when it matters
+    data = listing_card_serializer.many(listings)
+    if watchlist_ids is not None:
+        for item, listing in zip(data, listings):
+            item["watchlist"] = listing.id in watchlist_ids
+    return data
@@ -1,11 +1,18 @@
+import hashlib
 import random
 import string
+import time
 from datetime import datetime, timedelta
 
 from jose import jwt
 from passlib.context import CryptContext
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.common.caches import TTLCache
 from app.core.config import settings
+from app.db.loaders import token_user
 from app.db.managers.accounts import user_manager, jwt_manager
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -46,18 +53,60 @@ def verify_refresh_token(token):
         return False
 
 
+# Resolved users of recently seen access tokens, keyed by token digest
+auth_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_SIZE)
+
+
+def get_token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def detached_copy(obj):
+    # Session-free snapshot of a loaded object and its loaded relationships
+    state = inspect(obj)
+    mapper = state.mapper
+    copy = mapper.class_(
+        **{attr.key: state.dict.get(attr.key) for attr in mapper.column_attrs}
+    )
+    make_transient_to_detached(copy)
+    for relationship in mapper.relationships:
+        if relationship.key in state.dict:
+            value = state.dict[relationship.key]
+            value = detached_copy(value) if value is not None else None
+            set_committed_value(copy, relationship.key, value)
+    return copy
+
+
+def invalidate_user_tokens(user_id):
+    for key, user in auth_cache.items():
+        if user.id == user_id:
+            auth_cache.delete(key)
+
+
 # deocde access token from header
 async def decodeJWT(db, token):
     if not token:
         return None
 
+    key = get_token_key(token)
+    user = auth_cache.get(key)
+    if user:
+        # Attach a copy to this request's session without querying
+        return await db.merge(user, load=False)
+
     try:
         decoded = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
     except:
         return None
 
     if decoded:
-        jwt_obj = await jwt_manager.get_by_user_id(db, decoded["user_id"])
+        jwt_obj = await jwt_manager.get_by_user_id(
+            db, decoded["user_id"], *token_user()
+        )
         if not jwt_obj:
             return None
-        return jwt_obj.user
+        user = jwt_obj.user
+        ttl = min(decoded["exp"] - time.time(), settings.AUTH_CACHE_TTL_SECONDS)
+        if ttl > 0:
+            auth_cache.set(key, detached_copy(user), ttl=ttl)
+        return user
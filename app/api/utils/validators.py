@@ -1,10 +1,6 @@
-from sanic import SanicException
+from app.api.utils.pagination import validate_limit
 
 
 def validate_quantity(value):
-    if value:
-        try:
-            value = int(value)
-        except:
-            raise SanicException(message="Quantity must be an integer", status_code=400)
-    return value
+    # Kept for older callers, "quantity" is now just a page limit
+    return validate_limit(value, field="Quantity")
@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from typing import Iterable, Optional
+from urllib.parse import unquote, urlparse
+import asyncio, time
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries also expire.
+    **Parameters**
+    * `maxsize`: Max number of entries kept, least recently used are evicted first
+    * `ttl`: Default lifetime of an entry in seconds (None means no expiry)
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def items(self):
+        return [(key, value) for key, (value, _) in self._data.items()]
+
+    def clear(self):
+        self._data.clear()
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheError(Exception):
+    pass
+
+
+class MemoryBackend:
+    """
+    Per-worker cache backend. Entries are kept in a TTLCache along with their tags.
+    **Parameters**
+    * `maxsize`: Max number of entries kept
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self._cache = TTLCache(maxsize=maxsize)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._cache.get(key)
+        return item[0] if item else None
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]):
+        self._cache.set(key, (value, frozenset(tags)), ttl=ttl)
+
+    async def invalidate(self, *tags: str):
+        tags = set(tags)
+        for key, (_, entry_tags) in self._cache.items():
+            if not tags.isdisjoint(entry_tags):
+                self._cache.delete(key)
+
+    async def close(self):
+        self._cache.clear()
+
+    def metrics(self) -> dict:
+        return {"backend": "memory", **self._cache.metrics()}
+
+
+class RedisBackend:
+    """
+    Cache backend speaking the Redis protocol (RESP), shared by every worker.
+    Works with Redis or any server implementing GET, SET, DEL, SADD, SMEMBERS and
+    PEXPIRE. The keys of a tag are kept in a set, which is deleted with them.
+    **Parameters**
+    * `url`: Server url, e.g. redis://:password@localhost:6379/0
+    * `prefix`: Prepended to every key and tag
+    * `connect_timeout`: Seconds allowed to open the connection
+    """
+
+    def __init__(self, url: str, prefix: str = "cache:", connect_timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.prefix = prefix
+        self.connect_timeout = connect_timeout
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%b\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise CacheError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise CacheError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            if int(rest) < 0:
+                return None
+            return (await self._reader.readexactly(int(rest) + 2))[:-2]
+        if kind == b"*":
+            if int(rest) < 0:
+                return None
+            return [await self.read_reply() for _ in range(int(rest))]
+        raise CacheError(f"Unexpected reply: {line!r}")
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.connect_timeout
+        )
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await self.send(setup)
+
+    async def send(self, commands: list) -> list:
+        # Commands are pipelined: all written at once, then their replies read in order
+        self._writer.write(b"".join(self.encode(*command) for command in commands))
+        await self._writer.drain()
+        return [await self.read_reply() for _ in commands]
+
+    async def execute(self, *commands) -> list:
+        async with self._lock:
+            try:
+                if not self._writer or self._writer.is_closing():
+                    await self.connect()
+                return await self.send(commands)
+            except BaseException:
+                # The connection may be halfway through a reply, don't reuse it
+                self.disconnect()
+                raise
+
+    def disconnect(self):
+        if self._writer:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        (value,) = await self.execute(("GET", self.prefix + key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]):
+        key, ttl_ms = self.prefix + key, int(ttl * 1000)
+        commands = [("SET", key, value, "PX", ttl_ms)]
+        for tag in tags:
+            tag = f"{self.prefix}tag:{tag}"
+            commands += [("SADD", tag, key), ("PEXPIRE", tag, ttl_ms)]
+        await self.execute(*commands)
+
+    async def invalidate(self, *tags: str):
+        tags = [f"{self.prefix}tag:{tag}" for tag in tags]
+        replies = await self.execute(*[("SMEMBERS", tag) for tag in tags])
+        keys = {key for members in replies for key in members or []}
+        await self.execute(("DEL", *keys, *tags))
+
+    async def close(self):
+        async with self._lock:
+            self.disconnect()
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "connected": bool(self._writer),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
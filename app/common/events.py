@@ -0,0 +1,142 @@
+from typing import Optional
+from uuid import uuid4
+import asyncio, json
+
+import psycopg
+
+# Domain events, also the names of the Sanic signals they are dispatched as
+BID_PLACED = "auction.bid.placed"
+LISTING_UPDATED = "auction.listing.updated"
+LISTING_CLOSED = "auction.listing.closed"
+WATCHLIST_CHANGED = "auction.watchlist.changed"
+TOKEN_REVOKED = "auction.token.revoked"
+USER_UPDATED = "auction.user.updated"
+CONTENT_CHANGED = "auction.content.changed"  # Site details, reviews or categories
+
+# Dispatched locally when notifications may have been missed (listener reconnected)
+EVENTS_LOST = "auction.events.lost"
+
+
+class EventBus:
+    """
+    Propagates domain events to every worker through Postgres LISTEN/NOTIFY.
+    An event is dispatched as a Sanic signal on the publishing worker straight
+    away, and on every other worker once its notification arrives.
+    **Parameters**
+    * `channel`: The Postgres channel events are sent on
+    * `reconnect_seconds`: Delay before reconnecting a dropped listener
+    * `connect_timeout`: Seconds allowed to open a connection
+    """
+
+    def __init__(
+        self,
+        channel: str = "app_events",
+        reconnect_seconds: float = 2.0,
+        connect_timeout: int = 5,
+    ):
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self.connect_timeout = connect_timeout
+        self.origin = uuid4().hex  # Tells our own notifications apart
+        self._app = None
+        self._dsn = None
+        self._publisher = None
+        self._publish_lock = None
+        self._listener = None
+
+        # Metrics
+        self.published = 0
+        self.received = 0
+        self.failed = 0
+
+    async def start(self, app):
+        if self._listener:
+            return
+        self._app = app
+        self._dsn = app.ctx.engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        self._publish_lock = asyncio.Lock()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if not self._listener:
+            return
+        self._listener.cancel()
+        await asyncio.gather(self._listener, return_exceptions=True)
+        self._listener = None
+        if self._publisher:
+            await self._publisher.close()
+            self._publisher = None
+        self._app = None
+
+    async def _connect(self) -> psycopg.AsyncConnection:
+        return await psycopg.AsyncConnection.connect(
+            self._dsn, autocommit=True, connect_timeout=self.connect_timeout
+        )
+
+    async def publish(self, event: str, data: dict):
+        if not self._app:
+            return  # Not serving (e.g. scripts), nobody to notify
+
+        # This worker sees its own writes immediately, others via NOTIFY
+        await self.dispatch(event, data)
+
+        payload = json.dumps({"event": event, "origin": self.origin, "data": data})
+        try:
+            async with self._publish_lock:
+                if not self._publisher or self._publisher.closed:
+                    self._publisher = await self._connect()
+                await self._publisher.execute(
+                    "SELECT pg_notify(%s, %s)", (self.channel, payload)
+                )
+            self.published += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Event Error - {e}")
+
+    async def dispatch(self, event: str, data: Optional[dict] = None):
+        try:
+            await self._app.dispatch(
+                event,
+                context={"app": self._app, "data": data},
+                inline=True,
+                fail_not_found=False,
+            )
+        except Exception as e:
+            print(f"Event Error - {event}: {e}")
+
+    async def _listen(self):
+        connected_before = False
+        while True:
+            try:
+                async with await self._connect() as conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    if connected_before:
+                        await self.dispatch(EVENTS_LOST)
+                    connected_before = True
+                    async for notify in conn.notifies():
+                        await self._receive(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event Error - {e}")
+            await asyncio.sleep(self.reconnect_seconds)
+
+    async def _receive(self, payload: str):
+        message = json.loads(payload)
+        if message["origin"] == self.origin:
+            return  # Already dispatched when it was published
+        self.received += 1
+        await self.dispatch(message["event"], message["data"])
+
+    def metrics(self) -> dict:
+        return {
+            "listening": bool(self._listener and not self._listener.done()),
+            "published": self.published,
+            "received": self.received,
+            "failed": self.failed,
+        }
+
+
+event_bus = EventBus()
@@ -1,4 +1,6 @@
+from app.common.responses import CustomResponse
 from app.core.config import settings
+from app.db import transactions
 
 
 def add_cors_headers(request, response):
@@ -10,6 +12,45 @@ def add_cors_headers(request, response):
         "Access-Control-Allow-Methods": "GET, POST, PUT, PATCH, DELETE, OPTIONS",
         "Access-Control-Allow-Origin": allowed_origin,
         "Access-Control-Allow-Credentials": "true",
-        "Access-Control-Allow-Headers": "origin, content-type, accept, authorization, x-xsrf-token, x-request-id, guestuserid",
+        "Access-Control-Allow-Headers": "origin, content-type, accept, authorization, x-xsrf-token, x-request-id, guestuserid, if-none-match",
+        "Access-Control-Expose-Headers": "etag",
     }
     response.headers.extend(headers)
+
+
+async def close_db_session(request, response):
+    # Finish the request's unit of work and return its connection to the pool
+    db = getattr(request.ctx, "db", None)
+    if not db:
+        return
+    try:
+        if response.status < 400:
+            await transactions.commit(db)
+        else:
+            await transactions.rollback(db)
+    except Exception as e:
+        # Nothing was saved, so the success response must not go out.
+        # Returning a response ends the middleware chain, CORS headers included.
+        print(f"Commit Error - {e}")
+        await transactions.rollback(db)
+        response = CustomResponse.error("Server Error", status_code=500)
+        add_cors_headers(request, response)
+        return response
+    finally:
+        await db.close()
+        request.ctx.db = None
+
+
+def conditional_get(request, response):
+    # Tags successful GET responses with an ETag, from the body unless the view
+    # set one, and empties them into a 304 when the client already has that version
+    if request.method != "GET" or response.status != 200:
+        return
+    etag = response.headers.get("ETag")
+    if not etag:
+        if not response.body:
+            return
+        etag = response.headers["ETag"] = CustomResponse.make_etag(response.body)
+    if CustomResponse.etag_matches(request, etag):
+        response.status = 304
+        response.body = b""
@@ -0,0 +1,100 @@
+from collections import defaultdict
+from typing import Optional
+import asyncio
+
+from app.core.config import settings
+
+
+class Subscription:
+    """
+    One subscriber's bounded queue of messages on a topic.
+    `get` returns None once the subscription is closed or evicted.
+    """
+
+    def __init__(self, topic: str, queue_size: int):
+        self.topic = topic
+        self.evicted = False
+        self.closed = False
+        self._queue = asyncio.Queue(maxsize=queue_size)
+
+    def put(self, message: str) -> bool:
+        if self.closed:
+            return True
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def get(self) -> Optional[str]:
+        if self.closed and self._queue.empty():
+            return None
+        return await self._queue.get()
+
+    def close(self, evicted: bool = False):
+        if self.closed:
+            return
+        self.closed = True
+        self.evicted = evicted
+        # Drop anything pending and wake up the reader
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+
+class PubSubHub:
+    """
+    In-process fan-out of messages to the subscribers of a topic.
+    A subscriber whose queue is full is evicted rather than slowing everyone down.
+    **Parameters**
+    * `queue_size`: Max number of messages waiting to be sent to one subscriber
+    """
+
+    def __init__(self, queue_size: int = 32):
+        self.queue_size = queue_size
+        self._topics = defaultdict(set)
+
+        # Metrics
+        self.published = 0
+        self.evicted = 0
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic, self.queue_size)
+        self._topics[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        subscribers = self._topics.get(subscription.topic)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._topics[subscription.topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return bool(self._topics.get(topic))
+
+    def publish(self, topic: str, message: str) -> int:
+        # Messages are serialized once by the caller and shared by every subscriber
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        self.published += 1
+        for subscription in list(subscribers):
+            if not subscription.put(message):
+                self.evicted += 1
+                subscription.close(evicted=True)
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def metrics(self) -> dict:
+        return {
+            "topics": len(self._topics),
+            "subscribers": sum(len(s) for s in self._topics.values()),
+            "published": self.published,
+            "evicted": self.evicted,
+        }
+
+
+bid_hub = PubSubHub(queue_size=settings.BID_FEED_QUEUE_SIZE)
@@ -1,47 +1,46 @@
-from sanic.response import json
+from sanic.response import HTTPResponse, json
 from datetime import datetime
+from decimal import Decimal
+from hashlib import blake2b
 from uuid import UUID
+import orjson
 
 
-def convert_to_str(value):
+def json_default(value):
+    # Only called by the encoder for values it can't serialize natively.
+    # orjson handles UUID and datetime itself, other encoders may not.
     if isinstance(value, datetime):
-        value = str(value.isoformat())
-    elif isinstance(value, UUID):
-        value = str(value)
-    return value
-
-
-def convert_unserializable_objects_to_string(data):
-    if isinstance(data, list):
-        for obj in data:
-            for key, value in obj.items():
-                obj[key] = convert_to_str(value)
-    else:
-        for key, value in data.items():
-            data[key] = convert_to_str(value)
-    return data
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{value!r} is not JSON serializable")
 
 
 class CustomResponse:
-    @staticmethod
-    def success(message, data=None, status_code=200):
+    # Any encoder taking a `default` hook fits, e.g. ujson.dumps
+    dumps = staticmethod(orjson.dumps)
+    default = staticmethod(json_default)
+
+    @classmethod
+    def success(cls, message, data=None, status_code=200, **extra):
         # returns a custom success response
 
         response = {
             "status": "success",
             "message": message,
             "data": data,
+            **extra,
         }
 
         if data == None:
             response.pop("data")
-        else:
-            response["data"] = convert_unserializable_objects_to_string(data)
 
-        return json(response, status=status_code)
+        return cls.json(response, status_code)
 
-    @staticmethod
-    def error(message, data=None, status_code=400):
+    @classmethod
+    def error(cls, message, data=None, status_code=400):
         # returns a custom error response
 
         response = {
@@ -51,4 +50,32 @@ class CustomResponse:
         }
 
         response.pop("data") if data == None else response
-        return json(response, status=status_code)
+        return cls.json(response, status_code)
+
+    @classmethod
+    def json(cls, response, status_code):
+        # Encoded in one pass, the default hook handles UUID, datetime and Decimal
+        return json(response, status=status_code, dumps=cls.dumps, default=cls.default)
+
+    @staticmethod
+    def make_etag(*parts) -> str:
+        # A strong ETag from a response body, or from values that change
+        # whenever the body would (a version), so it can be checked without building it
+        if len(parts) == 1 and isinstance(parts[0], bytes):
+            data = parts[0]
+        else:
+            data = "|".join(map(str, parts)).encode()
+        return f'"{blake2b(data, digest_size=16).hexdigest()}"'
+
+    @staticmethod
+    def etag_matches(request, etag: str) -> bool:
+        header = request.headers.get("If-None-Match")
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+    @staticmethod
+    def not_modified(etag: str):
+        return HTTPResponse(status=304, headers={"ETag": etag})
@@ -14,9 +14,14 @@ class Settings(BaseSettings):
     EMAIL_OTP_EXPIRE_SECONDS: int
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     REFRESH_TOKEN_EXPIRE_MINUTES: int
+    AUTH_CACHE_MAX_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 300
 
     # SECURITY
     SECRET_KEY: str
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 100
+    PASSWORD_HASH_REJECT_WHEN_SATURATED: bool = False
 
     # PROJECT DETAILS
     PROJECT_NAME: str
@@ -31,6 +36,12 @@ class Settings(BaseSettings):
     POSTGRES_DB: str
     SQLALCHEMY_DATABASE_URL: Optional[str] = None
 
+    # DATABASE POOL
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_PRE_PING: bool = True
+
     # FIRST SUPERUSER
     FIRST_SUPERUSER_EMAIL: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
@@ -48,6 +59,42 @@ class Settings(BaseSettings):
     MAIL_SENDER_PASSWORD: str
     MAIL_SENDER_HOST: str
     MAIL_SENDER_PORT: int
+    MAIL_USE_TLS: bool = True
+    MAIL_POOL_SIZE: int = 2
+    MAIL_QUEUE_SIZE: int = 1000
+    MAIL_BATCH_SIZE: int = 20
+    MAIL_MAX_RETRIES: int = 3
+    MAIL_DRAIN_TIMEOUT: int = 10
+
+    # EMAIL OUTBOX
+    EMAIL_OUTBOX_BATCH_SIZE: int = 20
+    EMAIL_OUTBOX_POLL_SECONDS: float = 2.0
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 300
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
+    EMAIL_OUTBOX_RETRY_SECONDS: int = 60
+
+    # BID FEED
+    BID_FEED_QUEUE_SIZE: int = 32
+
+    # AUCTION SCHEDULER
+    AUCTION_HORIZON_SECONDS: int = 600
+    AUCTION_RETRY_SECONDS: int = 5
+
+    # JANITOR
+    JANITOR_INTERVAL_SECONDS: int = 3600
+    JANITOR_BATCH_SIZE: int = 500
+    GUEST_USER_TTL_DAYS: int = 30
+    GUEST_USER_SEEN_INTERVAL_SECONDS: int = 86400
+    GUEST_USER_SEEN_CACHE_SIZE: int = 10000
+
+    # RESPONSE CACHE
+    RESPONSE_CACHE_URL: Optional[str] = None  # e.g. redis://localhost:6379/0
+    RESPONSE_CACHE_MAX_SIZE: int = 1000
+    RESPONSE_CACHE_TTL_SECONDS: int = 30
+    RESPONSE_CACHE_STALE_SECONDS: int = 300
+
+    # FILE URLS
+    FILE_URL_CACHE_SIZE: int = 20000
 
     # CLOUDINARY CONFIG
     CLOUDINARY_CLOUD_NAME: str
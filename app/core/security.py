@@ -1,10 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+
 from passlib.context import CryptContext
+from sanic import SanicException
+
+from app.core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 ALGORITHM = "HS256"
 
 
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool so it never blocks the event loop.
+    **Parameters**
+    * `max_workers`: Number of hashes computed concurrently
+    * `max_queue`: Number of hashes allowed to wait for a free worker
+    * `reject_when_saturated`: Raise a 503 instead of queueing past max_queue
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, reject_when_saturated: bool):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.reject_when_saturated = reject_when_saturated
+        self.executor = None
+        self._semaphore = None
+
+        # Metrics
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, func, *args):
+        if self.reject_when_saturated and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise SanicException(
+                message="Server is busy, please try again shortly", status_code=503
+            )
+
+        if not self.executor:
+            # Started lazily so each server (re)start gets a live pool
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="password-hasher"
+            )
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        self.queued += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        wait = time.perf_counter() - queued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.total_wait / self.completed
+            if self.completed
+            else 0.0,
+            "max_wait_seconds": self.max_wait,
+        }
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    reject_when_saturated=settings.PASSWORD_HASH_REJECT_WHEN_SATURATED,
+)
+
+
 # PASSWORDS
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -12,3 +102,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
@@ -0,0 +1,47 @@
+from sqlalchemy.orm import joinedload, load_only
+
+from app.db.models.accounts import Jwt, User
+from app.db.models.base import File
+from app.db.models.listings import Bid, Category, Listing
+
+# Relationships are declared lazy="raise", so a query loads nothing beyond its
+# own row unless it passes one of these profiles. Every relationship here is
+# many-to-one, so joining it widens rows without multiplying them.
+#
+# Listing feeds don't load ORM objects at all, see app.db.readmodels.
+#
+# Endpoint                                       Profile
+# GET  /listings/detail/<slug>                  listing_card (listing and related)
+# GET  /listings/detail/<slug>/bids             bid_card
+# PATCH /auctioneer/listings/<slug>             listing_card
+# GET  /auctioneer/listings/<slug>/bids         bid_card
+# GET  /reviews                                 user_card, of the reviewer
+# Any authenticated request                     token_user
+
+
+def user_card(relationship):
+    # A user shown by name and avatar next to something else
+    return joinedload(relationship).options(
+        load_only(User.id, User.first_name, User.last_name, User.avatar_id),
+        joinedload(User.avatar).load_only(File.id, File.resource_type),
+    )
+
+
+def listing_card(entity=Listing) -> tuple:
+    # What listing_serializer and CreateListingResponseDataSchema read.
+    # `entity` can be an alias of Listing, e.g. a LATERAL subquery.
+    return (
+        user_card(entity.auctioneer),
+        joinedload(entity.category).load_only(Category.name),
+        joinedload(entity.image).load_only(File.id, File.resource_type),
+    )
+
+
+def bid_card(entity=Bid) -> tuple:
+    # What bid_serializer reads
+    return (user_card(entity.user),)
+
+
+def token_user() -> tuple:
+    # The whole user behind an access token, which becomes the request's AuthUser
+    return (joinedload(Jwt.user).joinedload(User.avatar),)
@@ -1,10 +1,13 @@
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import or_, select, update
 
-from app.core.security import get_password_hash
+from app.common.events import TOKEN_REVOKED, USER_UPDATED, event_bus
+from app.core.config import settings
+from app.core.security import get_password_hash_async
 from app.db.managers.base import BaseManager
-from app.db.models.accounts import Jwt, Otp, User
+from app.db.models.accounts import EmailOutbox, Jwt, Otp, User
 from uuid import UUID
 import random
 
@@ -16,17 +19,20 @@ class UserManager(BaseManager[User]):
         ).scalar_one_or_none()
         return user
 
-    async def create(self, db: AsyncSession, obj_in) -> User:
+    async def create(self, db: AsyncSession, obj_in, commit: bool = True) -> User:
         # hash the password
-        obj_in.update({"password": get_password_hash(obj_in["password"])})
-        return await super().create(db, obj_in)
+        obj_in.update({"password": await get_password_hash_async(obj_in["password"])})
+        return await super().create(db, obj_in, commit)
 
-    async def update(self, db: AsyncSession, db_obj: User, obj_in) -> Optional[User]:
+    async def update(
+        self, db: AsyncSession, db_obj: User, obj_in, commit: bool = True
+    ) -> Optional[User]:
         # hash the password
         password = obj_in.get("password")
         if password:
-            obj_in["password"] = get_password_hash(password)
-        user = await super().update(db, db_obj, obj_in)
+            obj_in["password"] = await get_password_hash_async(password)
+        user = await super().update(db, db_obj, obj_in, commit)
+        await self.publish(db, USER_UPDATED, {"user_id": str(user.id)}, commit)
         return user
 
 
@@ -37,19 +43,33 @@ class OtpManager(BaseManager[Otp]):
         ).scalar_one_or_none()
         return otp
 
-    async def create(self, db: AsyncSession, obj_in) -> Optional[Otp]:
+    async def create(
+        self, db: AsyncSession, obj_in, commit: bool = True
+    ) -> Optional[Otp]:
         code = random.randint(100000, 999999)
         obj_in.update({"code": code})
         existing_otp = await self.get_by_user_id(db, obj_in["user_id"])
         if existing_otp:
-            return await self.update(db, existing_otp, {"code": code})
-        return await super().create(db, obj_in)
+            return await self.update(db, existing_otp, {"code": code}, commit)
+        return await super().create(db, obj_in, commit)
+
+    async def delete_expired(self, db: AsyncSession, limit: int) -> int:
+        before = datetime.utcnow() - timedelta(
+            seconds=settings.EMAIL_OTP_EXPIRE_SECONDS
+        )
+        return await self.delete_batch(db, self.model.updated_at < before, limit=limit)
 
 
 class JwtManager(BaseManager[Jwt]):
-    async def get_by_user_id(self, db: AsyncSession, user_id: str) -> Optional[Jwt]:
+    async def get_by_user_id(
+        self, db: AsyncSession, user_id: str, *options
+    ) -> Optional[Jwt]:
         jwt = (
-            await db.execute(select(self.model).where(self.model.user_id == user_id))
+            await db.execute(
+                select(self.model)
+                .where(self.model.user_id == user_id)
+                .options(*options)
+            )
         ).scalar_one_or_none()
         return jwt
 
@@ -59,17 +79,127 @@ class JwtManager(BaseManager[Jwt]):
         ).scalar_one_or_none()
         return jwt
 
-    async def delete_by_user_id(self, db: AsyncSession, user_id: UUID):
+    async def delete_by_user_id(
+        self, db: AsyncSession, user_id: UUID, commit: bool = True
+    ):
         jwt = (
             await db.execute(select(self.model).where(self.model.user_id == user_id))
         ).scalar_one_or_none()
-        await self.delete(db, jwt)
+        await self.delete(db, jwt, commit)
+
+    async def update(
+        self, db: AsyncSession, db_obj: Jwt, obj_in, commit: bool = True
+    ) -> Optional[Jwt]:
+        # Token rotation revokes the previous access token
+        jwt = await super().update(db, db_obj, obj_in, commit)
+        if jwt:
+            data = {"user_id": str(jwt.user_id)}
+            await self.publish(db, TOKEN_REVOKED, data, commit)
+        return jwt
+
+    async def delete(self, db: AsyncSession, db_obj: Optional[Jwt], commit=True):
+        if not db_obj:
+            return
+        user_id = db_obj.user_id
+        await super().delete(db, db_obj, commit)
+        await self.publish(db, TOKEN_REVOKED, {"user_id": str(user_id)}, commit)
+
+    async def delete_expired(self, db: AsyncSession, limit: int) -> int:
+        # Rows are rewritten on every refresh, so these can't be refreshed anymore.
+        # Their access tokens expired long before, so nothing needs revoking.
+        before = datetime.utcnow() - timedelta(
+            minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES
+        )
+        return await self.delete_batch(db, self.model.updated_at < before, limit=limit)
+
+
+class EmailOutboxManager(BaseManager[EmailOutbox]):
+    async def claim_batch(
+        self, db: AsyncSession, limit: int, lease_seconds: int
+    ) -> List[EmailOutbox]:
+        # Atomically mark up to `limit` due emails as sending. SKIP LOCKED lets
+        # concurrent dispatchers claim disjoint batches, and the lease lets rows
+        # held by a dispatcher that died be claimed again.
+        now = datetime.utcnow()
+        due = (
+            select(self.model.pkid)
+            .where(
+                or_(
+                    self.model.status == EmailOutbox.PENDING,
+                    (self.model.status == EmailOutbox.SENDING)
+                    & (self.model.claimed_at < now - timedelta(seconds=lease_seconds)),
+                ),
+                self.model.available_at <= now,
+            )
+            .order_by(self.model.pkid)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        emails = (
+            (
+                await db.execute(
+                    update(self.model)
+                    .where(self.model.pkid.in_(due.scalar_subquery()))
+                    .values(
+                        status=EmailOutbox.SENDING,
+                        attempts=self.model.attempts + 1,
+                        claimed_at=now,
+                        updated_at=now,
+                    )
+                    .returning(self.model),
+                    execution_options={"synchronize_session": False},
+                )
+            )
+            .scalars()
+            .all()
+        )
+        await db.commit()
+        return emails
+
+    async def mark_sent(self, db: AsyncSession, emails: List[EmailOutbox]):
+        if not emails:
+            return
+        now = datetime.utcnow()
+        await db.execute(
+            update(self.model)
+            .where(self.model.pkid.in_([email.pkid for email in emails]))
+            .values(status=EmailOutbox.SENT, sent_at=now, updated_at=now),
+            execution_options={"synchronize_session": False},
+        )
+        await db.commit()
+
+    async def mark_failed(
+        self,
+        db: AsyncSession,
+        email: EmailOutbox,
+        error: str,
+        max_attempts: int,
+        retry_seconds: int,
+    ):
+        # Back off linearly and give up after max_attempts
+        now = datetime.utcnow()
+        status = EmailOutbox.PENDING
+        if email.attempts >= max_attempts:
+            status = EmailOutbox.FAILED
+        await db.execute(
+            update(self.model)
+            .where(self.model.pkid == email.pkid)
+            .values(
+                status=status,
+                last_error=error,
+                available_at=now + timedelta(seconds=retry_seconds * email.attempts),
+                updated_at=now,
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        await db.commit()
 
 
 # How to use
 user_manager = UserManager(User)
 otp_manager = OtpManager(Otp)
 jwt_manager = JwtManager(Jwt)
+email_outbox_manager = EmailOutboxManager(EmailOutbox)
 
 
 # this can now be used to perform any available crud actions e.g user_manager.get_by_id(db=db, id=id)
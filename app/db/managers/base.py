@@ -1,17 +1,26 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import partial
 from typing import Generic, List, Optional, Type, TypeVar
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import delete, exists, select, update
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.common.caches import TTLCache
+from app.common.events import event_bus
+from app.core.config import settings
+from app.db import transactions
 from app.db.models.base import BaseModel, File, GuestUser
+from app.db.models.listings import WatchList
 
 ModelType = TypeVar("ModelType", bound=BaseModel)
 
 
 class BaseManager(Generic[ModelType]):
+    # Event published after every write made through the default methods, if any
+    change_event: Optional[str] = None
+
     def __init__(self, model: Type[ModelType]):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
@@ -21,6 +30,25 @@ class BaseManager(Generic[ModelType]):
         """
         self.model = model
 
+    async def save(self, db: AsyncSession, commit: bool = True):
+        # Commits the write, or only flushes it into the caller's unit of work
+        if commit:
+            await transactions.commit(db)
+        else:
+            await db.flush()
+
+    async def publish(self, db: AsyncSession, event: str, data: dict, commit=True):
+        # Other workers must not hear of a write before it is committed
+        if commit:
+            await event_bus.publish(event, data)
+        else:
+            transactions.after_commit(db, partial(event_bus.publish, event, data))
+
+    async def publish_write(self, db: AsyncSession, commit: bool = True):
+        if self.change_event:
+            data = {"table": self.model.__tablename__}
+            await self.publish(db, self.change_event, data, commit)
+
     async def get_all(self, db: AsyncSession) -> Optional[List[ModelType]]:
         result = (await db.execute(select(self.model))).scalars().all()
         return result
@@ -30,36 +58,47 @@ class BaseManager(Generic[ModelType]):
         # ids = [item[0] for item in items]
         return result
 
-    async def get_by_id(self, db: AsyncSession, id: UUID) -> Optional[ModelType]:
+    async def get_by_id(
+        self, db: AsyncSession, id: UUID, *options
+    ) -> Optional[ModelType]:
         return (
-            await db.execute(select(self.model).where(self.model.id == id))
+            await db.execute(
+                select(self.model).where(self.model.id == id).options(*options)
+            )
         ).scalar_one_or_none()
 
     async def create(
-        self, db: AsyncSession, obj_in: Optional[ModelType] = {}
+        self, db: AsyncSession, obj_in: Optional[ModelType] = {}, commit: bool = True
     ) -> Optional[ModelType]:
         obj_in["created_at"] = datetime.utcnow()
         obj_in["updated_at"] = obj_in["created_at"]
         obj = self.model(**obj_in)
 
         db.add(obj)
-        await db.commit()
-        await db.refresh(obj)
+        await self.save(db, commit)
+        await self.publish_write(db, commit)
         return obj
 
-    async def bulk_create(self, db: AsyncSession, obj_in: list) -> Optional[bool]:
+    async def bulk_create(
+        self, db: AsyncSession, obj_in: list, commit: bool = True
+    ) -> Optional[bool]:
         items = await db.execute(
             insert(self.model)
             .values(obj_in)
             .on_conflict_do_nothing()
             .returning(self.model.id)
         )
-        await db.commit()
         ids = [item[0] for item in items]
+        await self.save(db, commit)
+        await self.publish_write(db, commit)
         return ids
 
     async def update(
-        self, db: AsyncSession, db_obj: Optional[ModelType], obj_in: Optional[ModelType]
+        self,
+        db: AsyncSession,
+        db_obj: Optional[ModelType],
+        obj_in: Optional[ModelType],
+        commit: bool = True,
     ) -> Optional[ModelType]:
         if not db_obj:
             return None
@@ -67,26 +106,65 @@ class BaseManager(Generic[ModelType]):
             setattr(db_obj, attr, value)
         db_obj.updated_at = datetime.utcnow()
 
-        await db.commit()
-        await db.refresh(db_obj)
+        await self.save(db, commit)
+        await self.publish_write(db, commit)
         return db_obj
 
-    async def delete(self, db: AsyncSession, db_obj: Optional[ModelType]):
+    async def load(self, db: AsyncSession, obj: ModelType, *options):
+        """
+        Loads relationships of an object returned by a write, which only carries
+        its columns. Callers already holding the related objects should attach
+        them with `set_committed_value` instead.
+        **Parameters**
+        * `obj`: An object returned by create or update
+        * `options`: Loader options, usually a profile from app.db.loaders
+        """
+        await db.execute(
+            select(self.model)
+            .where(self.model.pkid == obj.pkid)
+            .options(*options)
+            .execution_options(populate_existing=True)
+        )
+        return obj
+
+    async def delete(
+        self, db: AsyncSession, db_obj: Optional[ModelType], commit: bool = True
+    ):
         if db_obj:
             await db.delete(db_obj)
-            await db.commit()
+            await self.save(db, commit)
+            await self.publish_write(db, commit)
 
-    async def delete_by_id(self, db: AsyncSession, id: UUID):
+    async def delete_by_id(self, db: AsyncSession, id: UUID, commit: bool = True):
         to_delete = (
             await db.execute(select(self.model).where(self.model.id == id))
         ).scalar_one_or_none()
         await db.delete(to_delete)
+        await self.save(db, commit)
+        await self.publish_write(db, commit)
+
+    async def delete_batch(self, db: AsyncSession, *where, limit: int) -> int:
+        # Deletes at most `limit` matching rows in one short transaction.
+        # SKIP LOCKED keeps concurrent runs (e.g. one per worker) off each other's rows.
+        batch = (
+            select(self.model.pkid)
+            .where(*where)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            delete(self.model)
+            .where(self.model.pkid.in_(batch.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        )
         await db.commit()
+        return result.rowcount
 
     async def delete_all(self, db: AsyncSession):
         to_delete = await db.delete(self.model)
         await db.execute(to_delete)
         await db.commit()
+        await self.publish_write(db)
 
 
 class FileManager(BaseManager[File]):
@@ -94,13 +172,48 @@ class FileManager(BaseManager[File]):
 
 
 class GuestUserManager(BaseManager[GuestUser]):
-    async def get_or_create(self, db: AsyncSession, id):
-        guestuser = await self.get_by_id(db, id)
+    def __init__(self, model: Type[GuestUser]):
+        super().__init__(model)
+        # Guests this worker marked as seen lately, so a guest's requests don't
+        # each write. Entries expire after GUEST_USER_SEEN_INTERVAL_SECONDS.
+        self.seen = TTLCache(
+            maxsize=settings.GUEST_USER_SEEN_CACHE_SIZE,
+            ttl=settings.GUEST_USER_SEEN_INTERVAL_SECONDS,
+        )
+
+    async def mark_seen(self, db: AsyncSession, id: UUID):
+        # Reads don't write guest rows, so this is what keeps a guest who only
+        # browses from looking idle. Unknown ids match no row.
+        if self.seen.get(id):
+            return
+        self.seen.set(id, True)
+        now = datetime.utcnow()
+        interval = timedelta(seconds=settings.GUEST_USER_SEEN_INTERVAL_SECONDS)
+        await db.execute(
+            update(self.model)
+            .where(self.model.id == id, self.model.updated_at < now - interval)
+            .values(updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def get_or_create(
+        self, db: AsyncSession, id: Optional[UUID], commit: bool = True
+    ):
+        guestuser = await self.get_by_id(db, id) if id else None
         if not guestuser:
-            guestuser = await self.create(db)
+            guestuser = await self.create(db, {}, commit)
         return guestuser
 
-    pass
+    async def delete_idle(self, db: AsyncSession, limit: int) -> int:
+        # Guests not seen, see mark_seen, and without watchlist writes for
+        # GUEST_USER_TTL_DAYS. Their watchlists go with them.
+        before = datetime.utcnow() - timedelta(days=settings.GUEST_USER_TTL_DAYS)
+        recent_watchlist = exists().where(
+            WatchList.session_key == self.model.id, WatchList.updated_at >= before
+        )
+        return await self.delete_batch(
+            db, self.model.updated_at < before, ~recent_watchlist, limit=limit
+        )
 
 
 file_manager = FileManager(File)
@@ -3,10 +3,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 from .base import BaseManager
+from app.common.events import CONTENT_CHANGED
+from app.db.loaders import user_card
 from app.db.models.general import SiteDetail, Subscriber, Review
 
 
 class SiteDetailManager(BaseManager[SiteDetail]):
+    change_event = CONTENT_CHANGED
+
     async def get(self, db: AsyncSession) -> Optional[SiteDetail]:
         sitedetail = (await db.execute(select(self.model))).scalar_one_or_none()
 
@@ -24,9 +28,17 @@ class SubscriberManager(BaseManager[Subscriber]):
 
 
 class ReviewManager(BaseManager[Review]):
+    change_event = CONTENT_CHANGED
+
     async def get_active(self, db: AsyncSession) -> Optional[Review]:
         reviews = (
-            (await db.execute(select(self.model).where(self.model.show == True)))
+            (
+                await db.execute(
+                    select(self.model)
+                    .where(self.model.show == True)
+                    .options(user_card(self.model.reviewer))
+                )
+            )
             .scalars()
             .all()
         )
@@ -1,16 +1,104 @@
-from typing import Optional, List, Any
-from sqlalchemy import or_, select
+from enum import Enum
+from typing import Optional, List, Any, Set, Tuple
+from sqlalchemy import (
+    Boolean,
+    column,
+    func,
+    literal_column,
+    or_,
+    select,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.utils.tokens import get_random
 
-from app.db.managers.base import BaseManager
+from app.common.dates import to_naive_utc
+from app.common.events import (
+    BID_PLACED,
+    CONTENT_CHANGED,
+    LISTING_CLOSED,
+    LISTING_UPDATED,
+    WATCHLIST_CHANGED,
+    event_bus,
+)
+from app.db.loaders import bid_card, listing_card
+from app.db.managers.base import BaseManager, ModelType
+from app.db.models.accounts import User
 from app.db.models.listings import Category, Listing, WatchList, Bid
 
+from datetime import datetime
 from uuid import UUID
 from slugify import slugify
 
+# Advisory lock key held by the worker closing due auctions
+AUCTION_CLOSING_LOCK_ID = 720341
+
+
+class SlugManager(BaseManager[ModelType]):
+    """
+    Manager of a model with a unique `slug` column. A taken slug gets a random
+    4 character suffix, and the unique constraint itself decides what is taken,
+    so concurrent writes can't end up with the same slug.
+    """
+
+    async def create_with_slug(
+        self, db: AsyncSession, obj_in: dict, slug: str, commit: bool = True
+    ) -> ModelType:
+        # Core inserts skip the model's @validates hooks, so a transient instance
+        # (never added to the session) runs them and hands back the values
+        validated = self.model(**obj_in)
+        obj_in = {key: getattr(validated, key) for key in obj_in}
+        obj_in["created_at"] = datetime.utcnow()
+        obj_in["updated_at"] = obj_in["created_at"]
+
+        # One INSERT ... ON CONFLICT (slug) DO NOTHING RETURNING per attempt
+        obj_in["slug"] = slug
+        while True:
+            stmt = (
+                insert(self.model)
+                .values(obj_in)
+                .on_conflict_do_nothing(index_elements=[self.model.slug])
+                .returning(self.model)
+            )
+            obj = (
+                await db.execute(select(self.model).from_statement(stmt))
+            ).scalar_one_or_none()
+            if obj:
+                break
+            obj_in["slug"] = f"{slug}-{get_random(4)}"
+
+        await self.save(db, commit)
+        await self.publish_write(db, commit)
+        return obj
+
+    async def update_slug(self, db: AsyncSession, db_obj: ModelType, slug: str):
+        # Renames are rare, so each attempt runs in a savepoint the
+        # unique constraint can roll back, instead of probing first
+        value = slug
+        while True:
+            try:
+                async with db.begin_nested():
+                    await db.execute(
+                        update(self.model)
+                        .where(self.model.pkid == db_obj.pkid)
+                        .values(slug=value)
+                        .execution_options(synchronize_session=False)
+                    )
+                break
+            except IntegrityError:
+                value = f"{slug}-{get_random(4)}"
+        set_committed_value(db_obj, "slug", value)
+
+
+class CategoryManager(SlugManager[Category]):
+    change_event = CONTENT_CHANGED
 
-class CategoryManager(BaseManager[Category]):
     async def get_by_name(self, db: AsyncSession, name: str) -> Optional[Category]:
         category = (
             await db.execute(select(self.model).where(self.model.name == name))
@@ -23,122 +111,243 @@ class CategoryManager(BaseManager[Category]):
         ).scalar_one_or_none()
         return category
 
-    async def create(self, db: AsyncSession, obj_in) -> Optional[Category]:
-        # Generate unique slug
-        created_slug = slugify(obj_in["name"])
-        updated_slug = obj_in.get("slug")
-        slug = updated_slug if updated_slug else created_slug
-
-        obj_in["slug"] = slug
-        slug_exists = await self.get_by_slug(db, slug)
-        if slug_exists:
-            random_str = get_random(4)
-            obj_in["slug"] = f"{created_slug}-{random_str}"
-            return await self.create(db, obj_in)
-
-        return await super().create(db, obj_in)
-
-
-class ListingManager(BaseManager[Listing]):
-    async def get_all(self, db: AsyncSession) -> Optional[List[Listing]]:
+    async def create(
+        self, db: AsyncSession, obj_in, commit: bool = True
+    ) -> Optional[Category]:
+        slug = obj_in.get("slug") or slugify(obj_in["name"])
+        return await self.create_with_slug(db, obj_in, slug, commit)
+
+
+class ListingManager(SlugManager[Listing]):
+    def paginate(
+        self, stmt, cursor: Optional[Tuple[datetime, UUID]], limit: Optional[int]
+    ):
+        # Keyset pagination on (created_at, id), newest first
+        if cursor:
+            stmt = stmt.where(tuple_(self.model.created_at, self.model.id) < cursor)
+        stmt = stmt.order_by(self.model.created_at.desc(), self.model.id.desc())
+        if limit:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    async def get_all(
+        self,
+        db: AsyncSession,
+        cursor: Optional[Tuple[datetime, UUID]] = None,
+        limit: Optional[int] = None,
+    ) -> Optional[List[Listing]]:
+        # Feeds are read through app.db.readmodels, this is for Listing instances
         return (
             (
                 await db.execute(
-                    select(self.model).order_by(self.model.created_at.desc())
+                    self.paginate(
+                        select(self.model).options(*listing_card()), cursor, limit
+                    )
                 )
             )
             .scalars()
             .all()
         )
 
-    async def get_by_auctioneer_id(
-        self, db: AsyncSession, auctioneer_id: UUID
+    async def get_by_slug(
+        self, db: AsyncSession, slug: str, *options
     ) -> Optional[Listing]:
-        return (
-            (
-                await db.execute(
-                    select(self.model)
-                    .where(self.model.auctioneer_id == auctioneer_id)
-                    .order_by(self.model.created_at.desc())
-                )
-            )
-            .scalars()
-            .all()
-        )
-
-    async def get_by_slug(self, db: AsyncSession, slug: str) -> Optional[Listing]:
         listing = (
-            await db.execute(select(self.model).where(self.model.slug == slug))
+            await db.execute(
+                select(self.model).where(self.model.slug == slug).options(*options)
+            )
         ).scalar_one_or_none()
         return listing
 
-    async def get_related_listings(
-        self, db: AsyncSession, category_id: Any, slug: str
-    ) -> Optional[List[Listing]]:
-        listings = (
-            (
-                await db.execute(
-                    select(self.model)
-                    .where(
-                        self.model.category_id == category_id, self.model.slug != slug
-                    )
-                    .order_by(self.model.created_at.desc())
+    async def get_bid_summary_by_slug(
+        self, db: AsyncSession, slug: str
+    ) -> Optional[Any]:
+        # Just the bid columns, without the listing's other columns.
+        # updated_at changes with every bid, so it also versions the listing's bids,
+        # and bidders_updated_at versions the names and avatars shown with them.
+        bidders_updated_at = (
+            select(func.max(User.updated_at))
+            .join(Bid, Bid.user_id == User.id)
+            .where(Bid.listing_id == self.model.id)
+            .scalar_subquery()
+        )
+        summary = (
+            await db.execute(
+                select(
+                    self.model.highest_bid,
+                    self.model.bids_count,
+                    self.model.updated_at,
+                    bidders_updated_at.label("bidders_updated_at"),
+                ).where(self.model.slug == slug)
+            )
+        ).one_or_none()
+        return summary
+
+    async def get_detail_by_slug(
+        self,
+        db: AsyncSession,
+        slug: str,
+        related_limit: int = 0,
+        bids_limit: int = 0,
+    ) -> Tuple[Optional[Listing], List[Listing], List[Bid]]:
+        # Fetch a listing with its top related listings and latest bids in one
+        # round trip using LATERAL joins. Rows are at most related x bids limits.
+        stmt = (
+            select(self.model)
+            .select_from(self.model)
+            .where(self.model.slug == slug)
+            .options(*listing_card())
+        )
+
+        related = None
+        if related_limit:
+            other = aliased(self.model)
+            related = aliased(
+                self.model,
+                select(other)
+                .where(
+                    other.category_id == self.model.category_id,
+                    other.slug != self.model.slug,
                 )
+                .order_by(other.created_at.desc())
+                .limit(related_limit)
+                .lateral(),
             )
-            .scalars()
-            .all()
+            stmt = (
+                stmt.add_columns(related)
+                .outerjoin(related, true())
+                .options(*listing_card(related))
+                .order_by(related.created_at.desc())
+            )
+
+        bids = None
+        if bids_limit:
+            bids = aliased(
+                Bid,
+                select(Bid)
+                .where(Bid.listing_id == self.model.id)
+                .order_by(Bid.updated_at.desc())
+                .limit(bids_limit)
+                .lateral(),
+            )
+            stmt = (
+                stmt.add_columns(bids)
+                .outerjoin(bids, true())
+                .options(*bid_card(bids))
+                .order_by(bids.updated_at.desc())
+            )
+
+        rows = (await db.execute(stmt)).all()
+        if not rows:
+            return None, [], []
+
+        # A LATERAL subquery's ORDER BY doesn't carry over to the joined rows, hence
+        # the outer one. Repeated rows resolve to the same objects through the
+        # identity map, and the dicts keep the order they first appear in.
+        related_listings, listing_bids = {}, {}
+        for row in rows:
+            _, *entities = row
+            if related is not None:
+                related_listing = entities.pop(0)
+                if related_listing:
+                    related_listings[related_listing.id] = related_listing
+            if bids is not None:
+                bid = entities.pop(0)
+                if bid:
+                    listing_bids[bid.id] = bid
+        return (
+            rows[0][0],
+            list(related_listings.values()),
+            list(listing_bids.values()),
         )
-        return listings
 
-    async def get_by_category(
-        self, db: AsyncSession, category: Optional[Category]
+    async def create(
+        self, db: AsyncSession, obj_in, commit: bool = True
     ) -> Optional[Listing]:
-        if category:
-            category = category.id
+        # Stored naive UTC, an aware closing_date would break the auction scheduler
+        if "closing_date" in obj_in:
+            obj_in["closing_date"] = to_naive_utc(obj_in["closing_date"])
+        slug = obj_in.get("slug") or slugify(obj_in["name"])
+        listing = await self.create_with_slug(db, obj_in, slug, commit)
+        await self.publish_update(db, listing, commit)
+        return listing
+
+    async def update(
+        self, db: AsyncSession, db_obj: Listing, obj_in, commit: bool = True
+    ) -> Listing:
+        if "closing_date" in obj_in:
+            obj_in["closing_date"] = to_naive_utc(obj_in["closing_date"])
+        name = obj_in.get("name")
+        if name and name != db_obj.name:
+            slug = obj_in.pop("slug", None) or slugify(name)
+            if slug != db_obj.slug:
+                await self.update_slug(db, db_obj, slug)
 
-        listings = (
+        listing = await super().update(db, db_obj, obj_in, commit)
+        await self.publish_update(db, listing, commit)
+        return listing
+
+    async def publish_update(self, db: AsyncSession, listing: Listing, commit=True):
+        closing_date = listing.closing_date
+        data = {
+            "listing_id": str(listing.id),
+            "slug": listing.slug,
+            "closing_date": closing_date.isoformat() if closing_date else None,
+        }
+        await self.publish(db, LISTING_UPDATED, data, commit)
+
+    async def get_closing_dates(
+        self, db: AsyncSession, until: datetime
+    ) -> List[datetime]:
+        # Served by the partial index on the closing dates of active listings
+        closing_dates = (
             (
                 await db.execute(
-                    select(self.model)
-                    .where(self.model.category_id == category)
-                    .order_by(self.model.created_at.desc())
+                    select(self.model.closing_date)
+                    .where(
+                        self.model.active == True,
+                        self.model.closing_date <= until,
+                    )
+                    .order_by(self.model.closing_date)
                 )
             )
             .scalars()
             .all()
         )
-        return listings
-
-    async def create(self, db: AsyncSession, obj_in) -> Optional[Listing]:
-        # Generate unique slug
+        return closing_dates
 
-        created_slug = slugify(obj_in["name"])
-        updated_slug = obj_in.get("slug")
-        slug = updated_slug if updated_slug else created_slug
-        obj_in["slug"] = slug
-        slug_exists = await self.get_by_slug(db, slug)
-        if slug_exists:
-            random_str = get_random(4)
-            obj_in["slug"] = f"{created_slug}-{random_str}"
-            return await self.create(db, obj_in)
-
-        return await super().create(db, obj_in)
+    async def close_due(self, db: AsyncSession, now: datetime) -> List[Any]:
+        # Only one worker closes auctions at a time, the others skip the tick
+        locked = (
+            await db.execute(
+                select(func.pg_try_advisory_xact_lock(AUCTION_CLOSING_LOCK_ID))
+            )
+        ).scalar()
+        if not locked:
+            await db.rollback()
+            return []
 
-    async def update(self, db: AsyncSession, db_obj: Listing, obj_in) -> Listing:
-        name = obj_in.get("name")
-        if name and name != db_obj.name:
-            # Generate unique slug
-            created_slug = slugify(name)
-            updated_slug = obj_in.get("slug")
-            slug = updated_slug if updated_slug else created_slug
-            obj_in["slug"] = slug
-            slug_exists = await self.get_by_slug(db, slug)
-            if slug_exists and not slug == db_obj.slug:
-                random_str = get_random(4)
-                obj_in["slug"] = f"{created_slug}-{random_str}"
-                return await self.update(db, db_obj, obj_in)
+        closed = (
+            await db.execute(
+                update(self.model)
+                .where(self.model.active == True, self.model.closing_date <= now)
+                .values(active=False, updated_at=now)
+                .returning(self.model.id, self.model.slug)
+                .execution_options(synchronize_session=False)
+            )
+        ).all()
+        await db.commit()
 
-        return await super().update(db, db_obj, obj_in)
+        # Notifications are capped at 8000 bytes, so large batches are split
+        for i in range(0, len(closed), 50):
+            data = {
+                "listings": [
+                    {"listing_id": str(id), "slug": slug}
+                    for id, slug in closed[i : i + 50]
+                ]
+            }
+            await event_bus.publish(LISTING_CLOSED, data)
+        return closed
 
 
 class WatchListManager(BaseManager[WatchList]):
@@ -161,6 +370,8 @@ class WatchListManager(BaseManager[WatchList]):
     async def get_by_session_key(
         self, db: AsyncSession, session_key: UUID, user_id: UUID
     ) -> Optional[List[WatchList]]:
+        if not session_key:
+            return []  # `session_key == None` would match every user's watchlists
         subquery = select(self.model.listing_id).where(self.model.user_id == user_id)
         watchlist = (
             (
@@ -176,29 +387,6 @@ class WatchListManager(BaseManager[WatchList]):
         )
         return watchlist
 
-    async def get_by_client_id(
-        self, db: AsyncSession, client_id: Optional[UUID]
-    ) -> Optional[List[WatchList]]:
-        if not client_id:
-            return []
-        watchlist = (
-            (
-                await db.execute(
-                    select(self.model)
-                    .where(
-                        or_(
-                            self.model.user_id == client_id,
-                            self.model.session_key == client_id,
-                        )
-                    )
-                    .order_by(self.model.created_at.desc())
-                )
-            )
-            .scalars()
-            .all()
-        )
-        return watchlist
-
     async def get_by_client_id_and_listing_id(
         self, db: AsyncSession, client_id: Optional[UUID], listing_id: UUID
     ) -> Optional[List[WatchList]]:
@@ -219,7 +407,28 @@ class WatchListManager(BaseManager[WatchList]):
         ).scalar_one_or_none()
         return watchlist
 
-    async def create(self, db: AsyncSession, obj_in: dict):
+    async def get_listing_ids_by_client_id(
+        self,
+        db: AsyncSession,
+        client_id: Optional[UUID],
+        listing_ids: Optional[List[UUID]] = None,
+    ) -> Set[UUID]:
+        # Watched listing ids, among listing_ids when given, in a single query
+        if not client_id or listing_ids == []:
+            return set()
+
+        query = select(self.model.listing_id).where(
+            or_(
+                self.model.user_id == client_id,
+                self.model.session_key == client_id,
+            )
+        )
+        if listing_ids is not None:
+            query = query.where(self.model.listing_id.in_(listing_ids))
+        watched_ids = (await db.execute(query)).scalars().all()
+        return set(watched_ids)
+
+    async def create(self, db: AsyncSession, obj_in: dict, commit: bool = True):
         user_id = obj_in.get("user_id")
         session_key = obj_in.get("session_key")
         listing_id = obj_in["listing_id"]
@@ -231,28 +440,52 @@ class WatchListManager(BaseManager[WatchList]):
         )
         if existing_watchlist:
             return existing_watchlist
-        return await super().create(db, obj_in)
+        watchlist = await super().create(db, obj_in, commit)
+        await self.publish_change(db, key, listing_id, commit)
+        return watchlist
 
+    async def bulk_create(self, db: AsyncSession, obj_in: list, commit: bool = True):
+        ids = await super().bulk_create(db, obj_in, commit)
+        for key in {item.get("user_id") or item.get("session_key") for item in obj_in}:
+            await self.publish_change(db, key, commit=commit)
+        return ids
+
+    async def delete(
+        self, db: AsyncSession, db_obj: Optional[WatchList], commit: bool = True
+    ):
+        if not db_obj:
+            return
+        key = db_obj.user_id or db_obj.session_key
+        listing_id = db_obj.listing_id
+        await super().delete(db, db_obj, commit)
+        await self.publish_change(db, key, listing_id, commit)
+
+    async def publish_change(
+        self,
+        db: AsyncSession,
+        client_id: UUID,
+        listing_id: Optional[UUID] = None,
+        commit: bool = True,
+    ):
+        data = {"client_id": str(client_id), "listing_id": None}
+        if listing_id:
+            data["listing_id"] = str(listing_id)
+        await self.publish(db, WATCHLIST_CHANGED, data, commit)
+
+
+class BidOutcome(str, Enum):
+    PLACED = "placed"
+    NOT_FOUND = "not_found"
+    OWN_LISTING = "own_listing"
+    CLOSED = "closed"
+    EXPIRED = "expired"
+    BELOW_PRICE = "below_price"
+    TOO_LOW = "too_low"
 
-class BidManager(BaseManager[Bid]):
-    async def get_by_user_id(
-        self, db: AsyncSession, user_id: UUID
-    ) -> Optional[List[Bid]]:
-        bids = (
-            (
-                await db.execute(
-                    select(self.model)
-                    .where(self.model.user_id == user_id)
-                    .order_by(self.model.updated_at.desc())
-                )
-            )
-            .scalars()
-            .all()
-        )
-        return bids
 
+class BidManager(BaseManager[Bid]):
     async def get_by_listing_id(
-        self, db: AsyncSession, listing_id: UUID
+        self, db: AsyncSession, listing_id: UUID, limit: Optional[int] = None
     ) -> Optional[List[Bid]]:
         bids = (
             (
@@ -260,6 +493,8 @@ class BidManager(BaseManager[Bid]):
                     select(self.model)
                     .where(self.model.listing_id == listing_id)
                     .order_by(self.model.updated_at.desc())
+                    .limit(limit)
+                    .options(*bid_card())
                 )
             )
             .scalars()
@@ -294,6 +529,99 @@ class BidManager(BaseManager[Bid]):
         new_bid = await super().create(db, obj_in)
         return new_bid
 
+    async def place_bid(
+        self, db: AsyncSession, slug: str, user: Any, amount: Any, commit: bool = True
+    ) -> Tuple[BidOutcome, Optional[Bid], Optional[int]]:
+        """
+        Places (or raises) a user's bid on a listing and returns the listing's
+        new bids count along with the bid.
+        The conditional UPDATE locks the listing row until the transaction ends, so
+        concurrent bids on the same listing are applied one after another against
+        the latest highest bid.
+        """
+        now = datetime.utcnow()
+        listing = (
+            await db.execute(
+                update(Listing)
+                .where(
+                    Listing.slug == slug,
+                    Listing.auctioneer_id != user.id,
+                    Listing.active == True,
+                    Listing.closing_date > now,
+                    Listing.price <= amount,
+                    Listing.highest_bid < amount,
+                )
+                .values(highest_bid=amount, updated_at=now)
+                .returning(Listing.id, Listing.bids_count)
+            )
+        ).one_or_none()
+        if not listing:
+            return await self.get_bid_outcome(db, slug, user, amount), None, None
+        listing_id, bids_count = listing
+
+        stmt = (
+            insert(self.model)
+            .values(
+                user_id=user.id,
+                listing_id=listing_id,
+                amount=amount,
+                created_at=now,
+                updated_at=now,
+            )
+            .on_conflict_do_update(
+                constraint="unique_user_listing_bids",
+                set_={"amount": amount, "updated_at": now},
+            )
+            # xmax is only set on a row the upsert updated
+            .returning(self.model, literal_column("xmax = 0").label("inserted"))
+        )
+        bid, inserted = (
+            await db.execute(
+                select(self.model, column("inserted", Boolean))
+                .from_statement(stmt)
+                .execution_options(populate_existing=True)
+            )
+        ).one()
+        if inserted:
+            bids_count += 1
+            await db.execute(
+                update(Listing)
+                .where(Listing.id == listing_id)
+                .values(bids_count=Listing.bids_count + 1)
+            )
+        await self.save(db, commit)
+        set_committed_value(bid, "user", user)
+        await self.publish(
+            db,
+            BID_PLACED,
+            {
+                "listing_id": str(listing_id),
+                "slug": slug,
+                "bid_id": str(bid.id),
+                "highest_bid": str(amount),
+                "bids_count": bids_count,
+            },
+            commit,
+        )
+        return BidOutcome.PLACED, bid, bids_count
+
+    async def get_bid_outcome(
+        self, db: AsyncSession, slug: str, user: Any, amount: Any
+    ) -> BidOutcome:
+        # Only reached when a bid was rejected, to tell the caller why
+        listing = await listing_manager.get_by_slug(db, slug)
+        if not listing:
+            return BidOutcome.NOT_FOUND
+        elif user.id == listing.auctioneer_id:
+            return BidOutcome.OWN_LISTING
+        elif not listing.active:
+            return BidOutcome.CLOSED
+        elif listing.time_left < 1:
+            return BidOutcome.EXPIRED
+        elif amount < listing.price:
+            return BidOutcome.BELOW_PRICE
+        return BidOutcome.TOO_LOW
+
 
 # How to use
 category_manager = CategoryManager(Category)
@@ -1,9 +1,12 @@
 from sqlalchemy import (
     Boolean,
     Column,
+    DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
+    Text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -32,7 +35,7 @@ class User(BaseModel):
         ForeignKey("files.id", ondelete="CASCADE"),
         unique=True,
     )
-    avatar = relationship("File", lazy="joined")
+    avatar = relationship("File", lazy="raise")
 
     @property
     def full_name(self):
@@ -53,7 +56,7 @@ class Jwt(BaseModel):
         ForeignKey("users.id", ondelete="CASCADE"),
         unique=True,
     )
-    user = relationship("User", lazy="joined")
+    user = relationship("User", lazy="raise")
     access = Column(String())
     refresh = Column(String())
 
@@ -68,11 +71,11 @@ class Otp(BaseModel):
         ForeignKey("users.id", ondelete="CASCADE"),
         unique=True,
     )
-    user = relationship("User", lazy="joined")
+    user = relationship("User", lazy="raise")
     code = Column(Integer())
 
     def __repr__(self):
-        return f"User - {self.user.get_full_name} | Code - {self.code}"
+        return f"User - {self.user_id} | Code - {self.code}"
 
     def check_expiration(self):
         now = datetime.utcnow()
@@ -80,3 +83,36 @@ class Otp(BaseModel):
         if diff.total_seconds() > settings.EMAIL_OTP_EXPIRE_SECONDS:
             return True
         return False
+
+
+class EmailOutbox(BaseModel):
+    __tablename__ = "email_outboxes"
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+    )
+    email = Column(String())
+    name = Column(String(50))
+    type = Column(String(30))
+    # Generated when the email is queued, so retries send the same code
+    otp = Column(Integer(), nullable=True)
+
+    status = Column(String(10), default=PENDING)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text(), nullable=True)
+    available_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"{self.type} - {self.email} | {self.status}"
+
+    __table_args__ = (
+        Index("ix_email_outboxes_status_available_at", "status", "available_at"),
+    )
@@ -17,6 +17,9 @@ class BaseModel(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+    # Server generated values come back in the INSERT/UPDATE's RETURNING clause
+    __mapper_args__ = {"eager_defaults": True}
+
 
 class File(BaseModel):
     __tablename__ = "files"
@@ -45,7 +45,7 @@ class Review(BaseModel):
         UUID(as_uuid=True),
         ForeignKey("users.id", ondelete="CASCADE"),
     )
-    reviewer = relationship("User", lazy="joined")
+    reviewer = relationship("User", lazy="raise")
     show = Column(Boolean, default=False)
     text = Column(String(200))
 
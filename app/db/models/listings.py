@@ -3,6 +3,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     String,
     Text,
     Numeric,
@@ -39,7 +40,7 @@ class Listing(BaseModel):
     auctioneer_id = Column(
         UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE")
     )
-    auctioneer = relationship("User", lazy="joined")
+    auctioneer = relationship("User", lazy="raise")
 
     name = Column(String(70))
     slug = Column(String(), unique=True)
@@ -49,7 +50,7 @@ class Listing(BaseModel):
         ForeignKey("categories.id", ondelete="SET NULL"),
         nullable=True,
     )
-    category = relationship("Category", lazy="joined")
+    category = relationship("Category", lazy="raise")
 
     price = Column(Numeric(precision=10, scale=2))
     highest_bid = Column(Numeric(precision=10, scale=2), default=0.00)
@@ -62,11 +63,20 @@ class Listing(BaseModel):
         ForeignKey("files.id", ondelete="SET NULL"),
         unique=True,
     )
-    image = relationship("File", lazy="joined")
+    image = relationship("File", lazy="raise")
 
     def __repr__(self):
         return self.name
 
+    __table_args__ = (
+        # Lets the auction scheduler find upcoming deadlines of open listings only
+        Index(
+            "ix_listings_active_closing_date",
+            "closing_date",
+            postgresql_where=active.is_(True),
+        ),
+    )
+
     @property
     def time_left_seconds(self):
         remaining_time = self.closing_date - datetime.utcnow()
@@ -84,15 +94,16 @@ class Bid(BaseModel):
     __tablename__ = "bids"
 
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
-    user = relationship("User", lazy="joined")
+    user = relationship("User", lazy="raise")
     listing_id = Column(
         UUID(as_uuid=True), ForeignKey("listings.id", ondelete="CASCADE")
     )
-    listing = relationship("Listing", lazy="joined")
+    listing = relationship("Listing", lazy="raise")
     amount = Column(Numeric(precision=10, scale=2))
 
     def __repr__(self):
-        return f"{self.listing.name} - ${self.amount}"
+        # Relationships are lazy="raise", so only columns are shown
+        return f"Listing - {self.listing_id} | ${self.amount}"
 
     __table_args__ = (
         UniqueConstraint("listing_id", "amount", name="unique_listing_amount_bids"),
@@ -104,21 +115,19 @@ class WatchList(BaseModel):
     __tablename__ = "watchlists"
 
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
-    user = relationship("User", lazy="joined")
+    user = relationship("User", lazy="raise")
 
     listing_id = Column(
         UUID(as_uuid=True), ForeignKey("listings.id", ondelete="CASCADE")
     )
-    listing = relationship("Listing", lazy="joined")
+    listing = relationship("Listing", lazy="raise")
 
     session_key = Column(
         UUID(as_uuid=True), ForeignKey("guestusers.id", ondelete="CASCADE")
     )
 
     def __repr__(self):
-        if self.user:
-            return f"{self.listing.name} - {self.user.full_name()}"
-        return f"{self.listing.name} - {self.session_key}"
+        return f"Listing - {self.listing_id} | {self.user_id or self.session_key}"
 
     __table_args__ = (
         UniqueConstraint(
@@ -0,0 +1,134 @@
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.db.managers.listings import listing_manager
+from app.db.models.accounts import User
+from app.db.models.base import File
+from app.db.models.listings import Category, Listing, WatchList
+
+# Read models are plain records filled from column tuples, for reads that are
+# serialized right away. They skip what ORM instances cost per row: the
+# identity map, attribute instrumentation and a __dict__ per object.
+
+
+@dataclass(slots=True)
+class ListingCard:
+    # Field order is the column order of ListingReader.columns
+    id: UUID
+    name: str
+    slug: str
+    desc: str
+    price: Decimal
+    closing_date: datetime
+    active: bool
+    bids_count: int
+    highest_bid: Decimal
+    created_at: datetime
+    category_name: Optional[str]
+    image_id: Optional[UUID]
+    image_type: Optional[str]
+    auctioneer_id: UUID
+    auctioneer_first_name: str
+    auctioneer_last_name: str
+    auctioneer_avatar_id: Optional[UUID]
+    auctioneer_avatar_type: Optional[str]
+
+    @property
+    def time_left_seconds(self):
+        return (self.closing_date - datetime.utcnow()).total_seconds()
+
+
+class ListingReader:
+    """
+    Listing feeds as ListingCards, with what listing_card_serializer reads and
+    nothing else. Sorted and paginated like the ListingManager feeds.
+    """
+
+    def __init__(self):
+        image, avatar = aliased(File), aliased(File)
+        self.columns = (
+            Listing.id,
+            Listing.name,
+            Listing.slug,
+            Listing.desc,
+            Listing.price,
+            Listing.closing_date,
+            Listing.active,
+            Listing.bids_count,
+            Listing.highest_bid,
+            Listing.created_at,
+            Category.name,
+            image.id,
+            image.resource_type,
+            User.id,
+            User.first_name,
+            User.last_name,
+            User.avatar_id,
+            avatar.resource_type,
+        )
+        self.stmt = (
+            select(*self.columns)
+            .select_from(Listing)
+            .join(User, User.id == Listing.auctioneer_id)
+            .outerjoin(avatar, avatar.id == User.avatar_id)
+            .outerjoin(Category, Category.id == Listing.category_id)
+            .outerjoin(image, image.id == Listing.image_id)
+        )
+
+    async def fetch(self, db: AsyncSession, stmt) -> List[ListingCard]:
+        return [ListingCard(*row) for row in (await db.execute(stmt)).tuples()]
+
+    async def get_all(
+        self,
+        db: AsyncSession,
+        cursor: Optional[Tuple[datetime, UUID]] = None,
+        limit: Optional[int] = None,
+    ) -> List[ListingCard]:
+        return await self.fetch(db, listing_manager.paginate(self.stmt, cursor, limit))
+
+    async def get_by_auctioneer_id(
+        self,
+        db: AsyncSession,
+        auctioneer_id: UUID,
+        cursor: Optional[Tuple[datetime, UUID]] = None,
+        limit: Optional[int] = None,
+    ) -> List[ListingCard]:
+        stmt = self.stmt.where(Listing.auctioneer_id == auctioneer_id)
+        return await self.fetch(db, listing_manager.paginate(stmt, cursor, limit))
+
+    async def get_by_category(
+        self,
+        db: AsyncSession,
+        category: Optional[Category],
+        cursor: Optional[Tuple[datetime, UUID]] = None,
+        limit: Optional[int] = None,
+    ) -> List[ListingCard]:
+        # No category means the listings of 'other'
+        category_id = category.id if category else None
+        stmt = self.stmt.where(Listing.category_id == category_id)
+        return await self.fetch(db, listing_manager.paginate(stmt, cursor, limit))
+
+    async def get_watched(
+        self, db: AsyncSession, client_id: Optional[UUID]
+    ) -> List[ListingCard]:
+        # Latest watched first
+        if not client_id:
+            return []
+        stmt = (
+            self.stmt.join(WatchList, WatchList.listing_id == Listing.id)
+            .where(
+                or_(WatchList.user_id == client_id, WatchList.session_key == client_id)
+            )
+            .order_by(WatchList.created_at.desc())
+        )
+        return await self.fetch(db, stmt)
+
+
+listing_reader = ListingReader()
@@ -0,0 +1,30 @@
+from inspect import isawaitable
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# A request is one unit of work: managers called with commit=False only flush
+# their writes, and the close_db_session middleware commits them all at once.
+# Whatever must wait for the writes to be committed (events other workers act
+# on, waking background tasks) is queued on the session until then.
+
+
+def after_commit(db: AsyncSession, callback: Callable):
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+async def commit(db: AsyncSession):
+    await db.commit()
+    # The writes are in, a failing callback mustn't make the caller think otherwise
+    for callback in db.info.pop("after_commit", []):
+        try:
+            result = callback()
+            if isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"After Commit Error - {e}")
+
+
+async def rollback(db: AsyncSession):
+    db.info.pop("after_commit", None)
+    await db.rollback()
@@ -9,11 +9,24 @@ from app.api.routes.auctioneer import auctioneer_router
 from app.api.routes.general import general_router
 
 from app.core.config import settings
+from app.core.security import password_hasher
+from app.api.utils.mailers import email_delivery
+from app.api.utils.emails import email_dispatcher
+from app.api.utils.auctions import auction_scheduler
+from app.api.utils.janitor import janitor
+from app.api.utils.file_processors import file_url_cache
+from app.api.utils.response_cache import response_cache
 from app.common.exception_handlers import (
     sanic_exceptions_handler,
     validation_exception_handler,
 )
-from app.common.middlewares import add_cors_headers
+from app.common.middlewares import (
+    add_cors_headers,
+    close_db_session,
+    conditional_get,
+)
+from app.common.events import event_bus
+from app.common.pubsub import bid_hub
 from pydantic import ValidationError
 
 from jinja2 import Environment, PackageLoader
@@ -50,15 +63,26 @@ app.ext.openapi.add_security_scheme(
 # ---------------------------
 # SETUP DATABASE
 # ---------------------
-def get_db(request: Request):
-    return request.app.ctx.db_conn
+def get_db(request: Request) -> AsyncSession:
+    # One session per request, opened lazily and closed by the close_db_session middleware
+    db = getattr(request.ctx, "db", None)
+    if not db:
+        db = request.ctx.db = request.app.ctx.SessionLocal()
+    return db
+
 
 @app.before_server_start
 async def add_dependencies(app, _):
     # Database
-    engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URL)
-    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
-    app.ctx.db_conn = SessionLocal()
+    engine = create_async_engine(
+        settings.SQLALCHEMY_DATABASE_URL,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    app.ctx.engine = engine
+    app.ctx.SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
     app.ext.add_dependency(AsyncSession, get_db)
 
     # Client
@@ -67,16 +91,41 @@ async def add_dependencies(app, _):
     # Auth User
     app.ext.add_dependency(AuthUser, get_user)
 
+    # Email delivery
+    email_delivery.start()
+    email_dispatcher.start(app)
+
+    # Auction closing
+    auction_scheduler.start(app)
+
+    # Maintenance
+    janitor.start(app)
+
+
+@app.after_server_start
+async def start_event_bus(app, _):
+    # Started after every before_server_start listener has set up the engine
+    await event_bus.start(app)
+
 
 @app.before_server_stop
 async def close_conection(app, _):
-    await app.ctx.db_conn.close()
+    await event_bus.stop()
+    await response_cache.stop()
+    await auction_scheduler.stop()
+    await janitor.stop()
+    await email_dispatcher.stop()
+    await email_delivery.stop()
+    await app.ctx.engine.dispose()
+    password_hasher.shutdown()
 
 
 # --------------------------
 # REGISTER MIDDLEWARES
 # --------------------------
 app.register_middleware(add_cors_headers, "response", priority=99)
+app.register_middleware(close_db_session, "response", priority=100)
+app.register_middleware(conditional_get, "response", priority=98)
 
 # EXCEPTION HANDLERS
 app.error_handler.add(Exception, sanic_exceptions_handler)
@@ -106,3 +155,24 @@ app.config.SECRET = settings.SECRET_KEY
 @app.route("/ping", methods=["GET"], name="Healthcheck")
 async def healthcheck(request):
     return json({"success": "pong!"})
+
+
+@openapi.definition(
+    tag="HealthCheck",
+    summary="API Metrics",
+    description="This endpoint exposes in-process metrics of the current worker",
+)
+@app.route("/metrics", methods=["GET"], name="Metrics")
+async def metrics(request):
+    return json(
+        {
+            "password_hasher": password_hasher.metrics(),
+            "email_delivery": email_delivery.metrics(),
+            "bid_feed": bid_hub.metrics(),
+            "event_bus": event_bus.metrics(),
+            "auction_scheduler": auction_scheduler.metrics(),
+            "janitor": janitor.metrics(),
+            "file_urls": file_url_cache.metrics(),
+            "response_cache": response_cache.metrics(),
+        }
+    )
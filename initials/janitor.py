@@ -0,0 +1,28 @@
+import asyncio, os, sys
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+import logging
+
+from app.api.utils.janitor import janitor
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.core.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URL)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def main() -> None:
+    # Runs the janitor once, e.g. from cron or after a large import
+    logger.info("Deleting expired guest users, otps and jwts")
+    run = await janitor.run_once(SessionLocal)
+    for name in ("guestusers", "otps", "jwts"):
+        logger.info(f"{name}: {run[name]['deleted']} deleted in {run[name]['ms']}ms")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())